@@ -0,0 +1,99 @@
+# app/cachebus.py
+# Bus d'invalidation entre workers uvicorn, sans broker : une table de compteurs dans SQLite.
+#
+# Chaque route d'écriture appelle bump(db, "members"|"rsvp"|"photos") dans sa transaction ;
+# chaque cache local (ProcessCache) mémorise la version des espaces dont il dépend et
+# recalcule dès qu'un autre process les a fait avancer. Les versions sont lues une seule
+# fois par requête (un SELECT sur une table de 3 lignes), puis mémorisées dans la session.
+
+import threading
+from datetime import datetime
+from collections import OrderedDict
+
+from sqlalchemy import select, update, text
+from sqlalchemy.orm import Session
+
+from .models import CacheVersion
+from .metrics import CACHE_REQUESTS
+
+NAMESPACES = ("members", "rsvp", "photos")
+_SESSION_KEY = "cousinade_cache_versions"
+_SESSION_TS_KEY = "cousinade_cache_versions_at"
+
+
+def ensure_cache_versions(engine) -> None:
+    with engine.begin() as conn:
+        for name in NAMESPACES:
+            conn.execute(text("INSERT OR IGNORE INTO cache_versions (name, version, updated_at) "
+                              "VALUES (:n, 0, CURRENT_TIMESTAMP)"), {"n": name})
+        # Lignes créées avant la colonne updated_at
+        conn.execute(text("UPDATE cache_versions SET updated_at = CURRENT_TIMESTAMP WHERE updated_at IS NULL"))
+
+
+def current_versions(db: Session) -> dict[str, int]:
+    versions = db.info.get(_SESSION_KEY)
+    if versions is None:
+        rows = db.execute(select(CacheVersion.name, CacheVersion.version, CacheVersion.updated_at)).all()
+        versions = {name: version for name, version, _at in rows}
+        db.info[_SESSION_KEY] = versions
+        db.info[_SESSION_TS_KEY] = {name: at for name, _v, at in rows}
+    return versions
+
+
+def last_modified(db: Session, *names: str) -> datetime | None:
+    """Date du dernier bump parmi `names` (UTC, naïve), lue avec current_versions."""
+    current_versions(db)
+    stamps = [at for name, at in db.info[_SESSION_TS_KEY].items() if name in names and at is not None]
+    return max(stamps, default=None)
+
+
+def bump(db: Session, *names: str) -> None:
+    """Invalide les espaces `names` pour tous les process ; à appeler avant le commit de l'écriture."""
+    for name in names:
+        now = datetime.utcnow().replace(microsecond=0)
+        updated = db.execute(update(CacheVersion).where(CacheVersion.name == name)
+                             .values(version=CacheVersion.version + 1, updated_at=now)).rowcount
+        if not updated:
+            db.add(CacheVersion(name=name, version=1, updated_at=now))
+    db.info.pop(_SESSION_KEY, None)
+
+
+class ProcessCache:
+    """Cache local au process, valide tant que les versions de `depends_on` n'ont pas bougé.
+
+    `max_bytes` (optionnel) borne en plus la somme des len() des valeurs (corps déjà encodés).
+    """
+
+    def __init__(self, name: str, depends_on: tuple[str, ...], max_entries: int = 256, max_bytes: int | None = None):
+        self.name = name
+        self.depends_on = depends_on
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._data: OrderedDict = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def get(self, db: Session, key, compute):
+        versions = current_versions(db)
+        stamp = tuple(versions.get(n, 0) for n in self.depends_on)
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None and entry[0] == stamp:
+                self._data.move_to_end(key)
+                CACHE_REQUESTS.inc(cache=self.name, result="hit")
+                return entry[1]
+        CACHE_REQUESTS.inc(cache=self.name, result="miss")
+        # Calcul hors verrou ; avec le tampon lu *avant*, un write concurrent forcera un recalcul
+        value = compute()
+        size = len(value) if self.max_bytes is not None else 0
+        with self._lock:
+            old = self._data.pop(key, None)
+            if old is not None:
+                self._bytes -= old[2]
+            self._data[key] = (stamp, value, size)
+            self._bytes += size
+            while len(self._data) > self.max_entries or (
+                    self.max_bytes is not None and self._bytes > self.max_bytes and len(self._data) > 1):
+                _key, (_stamp, _value, old_size) = self._data.popitem(last=False)
+                self._bytes -= old_size
+        return value
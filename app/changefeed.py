@@ -0,0 +1,161 @@
+# app/changefeed.py
+# Flux de changements pour la synchro incrémentale : /api/changes?since=<jeton>
+#
+# Un listener after_flush note chaque insert / update / delete ORM des entités suivies dans
+# change_log. Le journal est compacté : une seule ligne par entité, qui reprend un nouveau seq
+# (AUTOINCREMENT, jamais réutilisé) à chaque écriture ; sa taille reste celle de la base, et
+# un client n'a besoin que de son dernier jeton pour récupérer ce qui a bougé depuis,
+# suppressions comprises (tombstones). Les écritures SQL brutes (migrations d'update_bdd)
+# ne passent pas par l'ORM et ne sont pas tracées.
+
+from datetime import datetime, date
+
+from sqlalchemy import event, select, delete, insert, func, text
+from sqlalchemy.orm import Session
+
+from .models import Member, ParentChild, Couple, PersonAttendance, Photo, ChangeLog
+
+TRACKED = {
+    Member: "members",
+    ParentChild: "parent_child",
+    Couple: "couples",
+    PersonAttendance: "attendance",
+    Photo: "photos",
+}
+MODELS = {name: model for model, name in TRACKED.items()}
+
+FIELDS = {
+    "members": ("id", "first_name", "last_name", "birth_date", "email", "phone", "address", "postal_code",
+                "city", "family_branch", "notes", "updated_at"),
+    "parent_child": ("id", "parent_id", "child_id"),
+    "couples": ("id", "partner_a_id", "partner_b_id", "status"),
+    "attendance": ("id", "person_id", "slot_id", "present"),
+    "photos": ("id", "member_id", "stored_name", "orig_name", "width", "height", "taken_at", "camera",
+               "placeholder", "created_at"),
+}
+
+_CHUNK = 500  # taille des IN (...) : reste sous la limite de variables SQLite
+
+
+def _record_changes(session: Session, flush_context) -> None:
+    # after_flush : les ids des nouveaux objets sont connus, new/dirty/deleted décrivent encore le flush
+    touched: dict[str, dict[int, bool]] = {}
+    for obj in session.new:
+        name = TRACKED.get(type(obj))
+        if name:
+            touched.setdefault(name, {})[obj.id] = False
+    for obj in session.dirty:
+        name = TRACKED.get(type(obj))
+        if name and session.is_modified(obj, include_collections=False):
+            touched.setdefault(name, {})[obj.id] = False
+    for obj in session.deleted:
+        name = TRACKED.get(type(obj))
+        if name and obj.id is not None:
+            touched.setdefault(name, {})[obj.id] = True
+    if not touched:
+        return
+
+    conn = session.connection()
+    for name, ids in touched.items():
+        _write(conn, name, ids)
+
+
+def _write(conn, name: str, ids: dict[int, bool]) -> None:
+    table = ChangeLog.__table__
+    now = datetime.utcnow()
+    id_list = list(ids)
+    for i in range(0, len(id_list), _CHUNK):
+        chunk = id_list[i:i + _CHUNK]
+        conn.execute(delete(table).where(table.c.entity == name, table.c.entity_id.in_(chunk)))
+        conn.execute(insert(table), [{"entity": name, "entity_id": eid, "deleted": ids[eid], "changed_at": now}
+                                     for eid in chunk])
+
+
+def mark_changed(db: Session, name: str, ids, deleted: bool = False) -> None:
+    """Pour les écritures en masse (update(Model) en executemany) qui ne passent pas par le flush."""
+    _write(db.connection(), name, {eid: deleted for eid in ids})
+
+
+def track_changes(session_factory) -> None:
+    """Branche le journal sur une sessionmaker (app, import CSV, scripts de backfill)."""
+    event.listen(session_factory, "after_flush", _record_changes)
+
+
+def seed_change_log(engine) -> None:
+    """Inscrit au journal les lignes qui n'y sont pas encore (base antérieure au flux, écritures SQL brutes).
+
+    Le premier appel d'un client passe alors par le même parcours paginé sur seq que les deltas.
+    Idempotent (INSERT OR IGNORE sur l'index unique), à lancer au démarrage.
+    """
+    with engine.begin() as conn:
+        for model, name in TRACKED.items():
+            conn.execute(text(
+                f"INSERT OR IGNORE INTO change_log (entity, entity_id, deleted, changed_at) "
+                f"SELECT :name, id, 0, CURRENT_TIMESTAMP FROM {model.__tablename__} ORDER BY id"
+            ), {"name": name})
+
+
+def current_token(db: Session) -> int:
+    return db.scalar(select(func.max(ChangeLog.seq))) or 0
+
+
+def _to_json(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return value
+
+
+def _serialize(name: str, obj) -> dict:
+    return {f: _to_json(getattr(obj, f)) for f in FIELDS[name]}
+
+
+def _load(db: Session, name: str, ids: list[int]) -> list:
+    model = MODELS[name]
+    rows = []
+    for i in range(0, len(ids), _CHUNK):
+        rows += db.scalars(select(model).where(model.id.in_(ids[i:i + _CHUNK]))).all()
+    return rows
+
+
+def changes_since(db: Session, since: int | None, limit: int = 500) -> dict:
+    """Changements postérieurs au jeton `since` ; sans jeton (ou jeton inconnu), synchro complète paginée.
+
+    `token` est à renvoyer tel quel au prochain appel ; `more` indique qu'il reste des
+    changements au-delà de `limit` (rappeler aussitôt avec le nouveau jeton). `full` signale
+    au client de repartir d'une copie vide ; les pages suivantes sont des deltas ordinaires.
+    """
+    full = not since or since > current_token(db)
+    if full:
+        since = 0
+
+    stmt = (select(ChangeLog.seq, ChangeLog.entity, ChangeLog.entity_id, ChangeLog.deleted)
+            .where(ChangeLog.seq > since)
+            .order_by(ChangeLog.seq)
+            .limit(limit + 1))
+    if full:
+        stmt = stmt.where(ChangeLog.deleted == False)  # noqa: E712 — copie vide : tombstones inutiles
+    rows = db.execute(stmt).all()
+    more = len(rows) > limit
+    rows = rows[:limit]
+
+    upserts: dict[str, list[int]] = {}
+    deleted: dict[str, list[int]] = {}
+    for row in rows:
+        (deleted if row.deleted else upserts).setdefault(row.entity, []).append(row.entity_id)
+
+    changes = {}
+    for name, ids in upserts.items():
+        objs = _load(db, name, ids)
+        changes[name] = [_serialize(name, o) for o in objs]
+        # Ligne supprimée hors ORM depuis : on la signale comme tombstone
+        missing = set(ids) - {o.id for o in objs}
+        if missing:
+            deleted.setdefault(name, []).extend(sorted(missing))
+
+    return {
+        "token": rows[-1].seq if rows else since,
+        "full": full,
+        "more": more,
+        "changes": changes,
+        "deleted": deleted,
+    }
@@ -0,0 +1,318 @@
+# app/compression.py
+# Compression des réponses (gzip, Brotli si installé) + variantes précompressées pour /static
+
+import os, gzip, time, zlib, struct, logging, threading, mimetypes
+
+import anyio
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.responses import FileResponse
+from starlette.staticfiles import StaticFiles, NotModifiedResponse
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+log = logging.getLogger("cousinade.compression")
+
+# Types déjà compressés (images, vidéos, archives) : on ne les touche pas
+COMPRESSIBLE_TYPES = (
+    "text/",
+    "application/json",
+    "application/javascript",
+    "application/xml",
+    "image/svg+xml",
+    "text/calendar",
+)
+PRECOMPRESSED_SUFFIXES = {"br": ".br", "gzip": ".gz"}
+
+
+def _accepted_encodings(headers: Headers) -> set[str]:
+    accepted = set()
+    for part in headers.get("accept-encoding", "").split(","):
+        token, _, params = part.strip().partition(";")
+        token = token.strip().lower()
+        if not token:
+            continue
+        if params.replace(" ", "").lower() in ("q=0", "q=0.0", "q=0.00", "q=0.000"):
+            continue
+        accepted.add(token)
+    return accepted
+
+
+def choose_encoding(headers: Headers) -> str | None:
+    accepted = _accepted_encodings(headers)
+    if brotli is not None and "br" in accepted:
+        return "br"
+    if "gzip" in accepted or "*" in accepted:
+        return "gzip"
+    return None
+
+
+def accepts_gzip(headers: Headers) -> bool:
+    """Pour les routes qui servent un gzip précompressé : préféré au br calculé à chaque requête."""
+    accepted = _accepted_encodings(headers)
+    return "gzip" in accepted or "*" in accepted
+
+
+def is_compressible(content_type: str) -> bool:
+    ctype = (content_type or "").split(";")[0].strip().lower()
+    return any(ctype.startswith(t) for t in COMPRESSIBLE_TYPES)
+
+
+class CompressionStats:
+    """Compteurs cumulés par encodage : octets avant/après et temps CPU passé à compresser."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.by_encoding: dict[str, dict[str, float]] = {}
+        self.skipped = 0
+
+    def record(self, encoding: str, raw: int, compressed: int, cpu_seconds: float):
+        with self._lock:
+            s = self.by_encoding.setdefault(encoding, {"responses": 0, "raw_bytes": 0, "compressed_bytes": 0, "cpu_seconds": 0.0})
+            s["responses"] += 1
+            s["raw_bytes"] += raw
+            s["compressed_bytes"] += compressed
+            s["cpu_seconds"] += cpu_seconds
+
+    def record_skip(self):
+        with self._lock:
+            self.skipped += 1
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            out = {"skipped": self.skipped, "encodings": {}}
+            for enc, s in self.by_encoding.items():
+                ratio = s["compressed_bytes"] / s["raw_bytes"] if s["raw_bytes"] else 1.0
+                out["encodings"][enc] = {**s, "ratio": round(ratio, 4)}
+            return out
+
+
+class _Compressor:
+    def __init__(self, encoding: str, level: int):
+        self.encoding = encoding
+        if encoding == "br":
+            self._c = brotli.Compressor(quality=min(level, 11))
+        else:
+            # wbits=31 -> en-tête gzip
+            self._c = zlib.compressobj(min(level, 9), zlib.DEFLATED, 31)
+
+    def compress(self, data: bytes, flush: bool) -> bytes:
+        if self.encoding == "br":
+            out = self._c.process(data)
+            return out + self._c.flush() if flush else out
+        out = self._c.compress(data)
+        return out + self._c.flush(zlib.Z_SYNC_FLUSH) if flush else out
+
+    def finish(self, data: bytes = b"") -> bytes:
+        if self.encoding == "br":
+            return self._c.process(data) + self._c.finish()
+        return self._c.compress(data) + self._c.flush(zlib.Z_FINISH)
+
+
+# ---- Fragments précompressés (gros bloc HTML identique pour tous, entouré d'un en-tête par utilisateur)
+class DeflateFragment:
+    """Bloc compressé une seule fois en deflate brut, terminé par un flush synchro (aligné sur l'octet).
+
+    Des segments deflate ainsi terminés peuvent être mis bout à bout : gzip_join() entoure le
+    fragment des parties propres à la requête sans recompresser le gros morceau.
+    La compression n'a lieu qu'au premier accès à `deflated` (jamais pour les clients sans gzip).
+    """
+
+    def __init__(self, data: bytes, level: int = 6):
+        self.data = data
+        self.level = level
+        self._deflated = None
+
+    @property
+    def deflated(self) -> bytes:
+        if self._deflated is None:
+            # Deux threads peuvent compresser en même temps : même résultat, le dernier gagne
+            c = zlib.compressobj(min(self.level, 9), zlib.DEFLATED, -15)
+            self._deflated = c.compress(self.data) + c.flush(zlib.Z_SYNC_FLUSH)
+        return self._deflated
+
+    def __len__(self):
+        return len(self.data) + len(self._deflated or b"")
+
+
+def gzip_join(parts: list, level: int = 6) -> bytes:
+    """Flux gzip valide à partir de bytes (compressés ici) et de DeflateFragment (déjà compressés)."""
+    out = [b"\x1f\x8b\x08\x00\x00\x00\x00\x00\x00\xff"]  # en-tête gzip minimal, mtime=0
+    crc = size = 0
+    for part in parts:
+        if isinstance(part, DeflateFragment):
+            raw, packed = part.data, part.deflated
+        else:
+            c = zlib.compressobj(min(level, 9), zlib.DEFLATED, -15)
+            raw, packed = part, c.compress(part) + c.flush(zlib.Z_SYNC_FLUSH)
+        crc = zlib.crc32(raw, crc)
+        size += len(raw)
+        out.append(packed)
+    out.append(b"\x03\x00")  # bloc final vide (BFINAL=1, Huffman fixe)
+    out.append(struct.pack("<II", crc & 0xFFFFFFFF, size & 0xFFFFFFFF))
+    return b"".join(out)
+
+
+class CompressionMiddleware:
+    """Middleware ASGI : gzip/Brotli selon Accept-Encoding, au-delà de `minimum_size` octets.
+
+    Les réponses en streaming sont compressées morceau par morceau (flush à chaque
+    chunk pour ne pas retarder l'affichage) ; les réponses déjà encodées ou dont le
+    type n'est pas compressible (images, zip, xlsx...) passent telles quelles.
+    """
+
+    def __init__(self, app, minimum_size: int = 1024, gzip_level: int = 6, brotli_quality: int = 5,
+                 stats: CompressionStats | None = None):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.levels = {"gzip": gzip_level, "br": brotli_quality}
+        self.stats = stats or CompressionStats()
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        encoding = choose_encoding(Headers(scope=scope))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        start_message = None
+        compressor: _Compressor | None = None
+        passthrough = False
+        raw_size = out_size = 0
+        cpu = 0.0
+
+        async def send_wrapper(message):
+            nonlocal start_message, compressor, passthrough, raw_size, out_size, cpu
+
+            if message["type"] == "http.response.start":
+                headers = Headers(raw=message["headers"])
+                if ("content-encoding" in headers or "content-range" in headers
+                        or not is_compressible(headers.get("content-type", ""))):
+                    passthrough = True
+                    self.stats.record_skip()
+                    await send(message)
+                else:
+                    start_message = message
+                return
+
+            if message["type"] != "http.response.body" or passthrough:
+                await send(message)
+                return
+
+            body = message.get("body", b"")
+            more_body = message.get("more_body", False)
+
+            if compressor is None and not more_body and len(body) < self.minimum_size:
+                # Trop petit : pas la peine de payer le CPU
+                passthrough = True
+                self.stats.record_skip()
+                await send(start_message)
+                await send(message)
+                return
+
+            first_chunk = compressor is None
+            if first_chunk:
+                compressor = _Compressor(encoding, self.levels[encoding])
+
+            t0 = time.thread_time()
+            data = compressor.compress(body, flush=True) if more_body else compressor.finish(body)
+            cpu += time.thread_time() - t0
+            raw_size += len(body)
+            out_size += len(data)
+
+            if first_chunk:
+                headers = MutableHeaders(raw=start_message["headers"])
+                headers["Content-Encoding"] = encoding
+                headers.add_vary_header("Accept-Encoding")
+                if "etag" in headers:
+                    # ETag faible : le corps envoyé diffère de l'original
+                    etag = headers["etag"]
+                    headers["ETag"] = etag if etag.startswith("W/") else f"W/{etag}"
+                del headers["Content-Length"]
+                if not more_body:
+                    headers["Content-Length"] = str(len(data))
+                await send(start_message)
+            await send({"type": "http.response.body", "body": data, "more_body": more_body})
+
+            if not more_body:
+                self.stats.record(encoding, raw_size, out_size, cpu)
+                log.debug("%s %s: %d -> %d octets (%s, %.2f ms CPU)", scope.get("method"), scope.get("path"),
+                          raw_size, out_size, encoding, cpu * 1000)
+
+        await self.app(scope, receive, send_wrapper)
+
+
+# ---- Fichiers statiques précompressés
+def precompress_static(directory: str, min_size: int = 1024, min_saving: float = 0.05) -> int:
+    """Génère les variantes .gz (et .br si Brotli est dispo) à côté des fichiers de `directory`.
+
+    Une variante n'est conservée que si elle fait gagner au moins `min_saving` ;
+    elle est régénérée dès que l'original est plus récent. Renvoie le nombre de fichiers écrits.
+    """
+    written = 0
+    for root, _dirs, files in os.walk(directory):
+        for name in files:
+            if name.endswith((".gz", ".br", ".tmp")):
+                continue
+            src = os.path.join(root, name)
+            st = os.stat(src)
+            if st.st_size < min_size:
+                continue
+            data = None
+            for encoding, suffix in PRECOMPRESSED_SUFFIXES.items():
+                if encoding == "br" and brotli is None:
+                    continue
+                dest = src + suffix
+                if os.path.exists(dest) and os.stat(dest).st_mtime >= st.st_mtime:
+                    continue
+                if data is None:
+                    with open(src, "rb") as fh:
+                        data = fh.read()
+                packed = brotli.compress(data, quality=11) if encoding == "br" else gzip.compress(data, 9, mtime=0)
+                if len(packed) > len(data) * (1 - min_saving):
+                    try:
+                        os.remove(dest)
+                    except FileNotFoundError:
+                        pass
+                    continue
+                # Appelé à l'import dans chaque worker uvicorn : un fichier temporaire par processus,
+                # os.replace() atomique, le dernier arrivé gagne (contenus identiques)
+                tmp = f"{dest}.{os.getpid()}.tmp"
+                with open(tmp, "wb") as fh:
+                    fh.write(packed)
+                os.replace(tmp, dest)
+                written += 1
+    if written:
+        log.info("precompress_static(%s): %d variante(s) écrite(s)", directory, written)
+    return written
+
+
+class PrecompressedStaticFiles(StaticFiles):
+    """StaticFiles qui sert `fichier.br` / `fichier.gz` quand le client l'accepte et que la variante existe."""
+
+    async def get_response(self, path: str, scope):
+        encoding = choose_encoding(Headers(scope=scope))
+        if encoding and scope["method"] in ("GET", "HEAD") and "range" not in Headers(scope=scope):
+            suffix = PRECOMPRESSED_SUFFIXES[encoding]
+            full_path, stat_result = await self._lookup(path + suffix)
+            if stat_result is not None:
+                media_type = mimetypes.guess_type(path)[0] or "application/octet-stream"
+                response = FileResponse(full_path, stat_result=stat_result, media_type=media_type,
+                                        headers={"Content-Encoding": encoding, "Vary": "Accept-Encoding"})
+                if self.is_not_modified(response.headers, Headers(scope=scope)):
+                    return NotModifiedResponse(response.headers)
+                return response
+        return await super().get_response(path, scope)
+
+    async def _lookup(self, path: str):
+        try:
+            full_path, stat_result = await anyio.to_thread.run_sync(self.lookup_path, path)
+        except (PermissionError, OSError):
+            return "", None
+        if stat_result is None or not os.path.isfile(full_path):
+            return "", None
+        return full_path, stat_result
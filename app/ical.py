@@ -0,0 +1,126 @@
+# app/ical.py
+# Flux iCalendar (RFC 5545) : week-ends, créneaux confirmés du foyer, anniversaires
+
+import hmac, hashlib
+from datetime import date, datetime, timedelta
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from .models import Member, EventWeekend, EventSlot, PersonAttendance
+
+PRODID = "-//Cousinade//Calendrier familial//FR"
+UID_DOMAIN = "cousinade"
+
+
+def feed_key(secret: str, member_id: int) -> str:
+    """Clé d'abonnement : les clients calendrier n'ont pas le cookie de session."""
+    return hmac.new(secret.encode(), f"calendar:{member_id}".encode(), hashlib.sha256).hexdigest()[:32]
+
+
+def check_feed_key(secret: str, member_id: int, key: str) -> bool:
+    return hmac.compare_digest(feed_key(secret, member_id), key or "")
+
+
+def _escape(text: str) -> str:
+    return (text.replace("\\", "\\\\").replace(";", "\\;").replace(",", "\\,")
+            .replace("\r\n", "\\n").replace("\n", "\\n"))
+
+
+def _fold(line: str) -> str:
+    """Lignes de 75 octets max, continuation par CRLF + espace (sans couper un caractère UTF-8)."""
+    out, current, size = [], "", 0
+    for ch in line:
+        n = len(ch.encode("utf-8"))
+        if size + n > 75:
+            out.append(current)
+            current, size = " ", 1
+        current += ch
+        size += n
+    out.append(current)
+    return "\r\n".join(out)
+
+
+def _event(uid: str, stamp: str, start: date, end: date, summary: str,
+           description: str | None = None, rrule: str | None = None) -> list[str]:
+    lines = ["BEGIN:VEVENT",
+             f"UID:{uid}@{UID_DOMAIN}",
+             f"DTSTAMP:{stamp}",
+             f"DTSTART;VALUE=DATE:{start:%Y%m%d}",
+             f"DTEND;VALUE=DATE:{end:%Y%m%d}",  # exclusif : lendemain du dernier jour
+             f"SUMMARY:{_escape(summary)}",
+             "TRANSP:TRANSPARENT"]
+    if description:
+        lines.append(f"DESCRIPTION:{_escape(description)}")
+    if rrule:
+        lines.append(f"RRULE:{rrule}")
+    lines.append("END:VEVENT")
+    return lines
+
+
+def shared_events(db: Session, stamp: str) -> list[str]:
+    """Événements communs à tous : week-ends et anniversaires (une seule fois par version)."""
+    lines = []
+    for w in db.scalars(select(EventWeekend).order_by(EventWeekend.start_date, EventWeekend.id)):
+        lines += _event(f"weekend-{w.id}", stamp, w.start_date, w.end_date + timedelta(days=1), w.name)
+
+    birthdays = db.execute(
+        select(Member.id, Member.first_name, Member.last_name, Member.birth_date)
+        .where(Member.birth_date.isnot(None))
+        .order_by(Member.id)
+    ).all()
+    for m in birthdays:
+        name = f"{m.first_name} {m.last_name}".strip()
+        lines += _event(f"birthday-{m.id}", stamp, m.birth_date, m.birth_date + timedelta(days=1),
+                        f"🎂 Anniversaire de {name}", description=f"Né(e) en {m.birth_date.year}",
+                        # 29 février : le dernier jour de février les années non bissextiles
+                        rrule="FREQ=YEARLY;BYMONTH=2;BYMONTHDAY=-1" if (m.birth_date.month, m.birth_date.day) == (2, 29)
+                        else "FREQ=YEARLY")
+    return lines
+
+
+def household_events(db: Session, stamp: str, person_ids: list[int], names: dict[int, str]) -> list[str]:
+    """Créneaux où au moins une personne du foyer a répondu « présent »."""
+    rows = db.execute(
+        select(EventSlot.id, EventSlot.date, EventSlot.label, EventWeekend.name, PersonAttendance.person_id)
+        .join(EventWeekend, EventWeekend.id == EventSlot.weekend_id)
+        .join(PersonAttendance, PersonAttendance.slot_id == EventSlot.id)
+        .where(PersonAttendance.person_id.in_(person_ids), PersonAttendance.present == True)  # noqa: E712
+        .order_by(EventSlot.date, EventSlot.order_index, EventSlot.id, PersonAttendance.person_id)
+    ).all()
+    slots: dict[int, dict] = {}
+    for slot_id, day, label, weekend_name, pid in rows:
+        s = slots.setdefault(slot_id, {"date": day, "label": label, "weekend": weekend_name, "people": []})
+        s["people"].append(names.get(pid, "?"))
+
+    lines = []
+    for slot_id, s in slots.items():
+        lines += _event(f"slot-{slot_id}-{min(person_ids)}", stamp, s["date"], s["date"] + timedelta(days=1),
+                        f"{s['label']} — {s['weekend']}", description="Présents : " + ", ".join(s["people"]))
+    return lines
+
+
+def fold_lines(lines: list[str]) -> bytes:
+    """Lignes pliées et encodées, prêtes à concaténer : le pliage caractère par caractère ne se fait qu'une fois."""
+    return "".join(_fold(l) + "\r\n" for l in lines).encode("utf-8")
+
+
+def calendar_head(name: str) -> bytes:
+    return fold_lines(["BEGIN:VCALENDAR",
+                       "VERSION:2.0",
+                       f"PRODID:{PRODID}",
+                       "CALSCALE:GREGORIAN",
+                       "METHOD:PUBLISH",
+                       f"X-WR-CALNAME:{_escape(name)}",
+                       "X-PUBLISHED-TTL:PT1H"])
+
+
+CALENDAR_TAIL = b"END:VCALENDAR\r\n"
+
+
+def build_calendar(name: str, events: list[str]) -> bytes:
+    return calendar_head(name) + fold_lines(events) + CALENDAR_TAIL
+
+
+def ical_stamp(when: datetime | None) -> str:
+    return (when or datetime(1970, 1, 1)).strftime("%Y%m%dT%H%M%SZ")
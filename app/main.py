@@ -1,6 +1,8 @@
 # app/main.py
 
-import secrets, datetime, json, os, io, re, unicodedata, logging
+import secrets, datetime, json, os, io, re, time, unicodedata, logging, hashlib
+from email.utils import format_datetime, parsedate_to_datetime
+from urllib.parse import urlencode
 from datetime import date
 
 from PIL import Image, ImageOps
@@ -14,10 +16,23 @@ from typing import List
 from sqlalchemy import create_engine, select, func, text, inspect, desc, case
 from sqlalchemy.orm import sessionmaker, Session
 from jinja2 import Environment, FileSystemLoader, select_autoescape
-from .models import Base, Member, ParentChild, Couple, EventWeekend, EventSlot, PersonAttendance, Photo
+from markupsafe import Markup
+from .models import normalize_email, Base, Member, ParentChild, Couple, EventWeekend, EventSlot, PersonAttendance, Photo
+from .compression import (CompressionMiddleware, CompressionStats, PrecompressedStaticFiles, precompress_static,
+                          DeflateFragment, gzip_join, accepts_gzip)
+from .zipstream import stream_zip
+from .reports import catering_rows, iter_csv, build_xlsx
+from .ratelimit import SlidingWindowLimiter
+from .cachebus import ProcessCache, bump, ensure_cache_versions, last_modified
+from .changefeed import track_changes, changes_since, seed_change_log
+from .ical import (feed_key, check_feed_key, shared_events, household_events, fold_lines, calendar_head,
+                   CALENDAR_TAIL, ical_stamp)
+from .photo_meta import extract_exif, exif_for_rendition, placeholder_data_uri
+from .renditions import RenditionCache
+from .metrics import MetricsMiddleware, instrument_engine, image_stage, render_prometheus, compression_lines, rendition_lines
 
 from fastapi import FastAPI, Request, Depends, Form,  UploadFile, File, HTTPException, status
-from fastapi.responses import HTMLResponse, RedirectResponse, Response
+from fastapi.responses import HTMLResponse, RedirectResponse, Response, JSONResponse, PlainTextResponse, StreamingResponse, FileResponse
 from fastapi.staticfiles import StaticFiles
 from starlette.middleware.sessions import SessionMiddleware
 from starlette.middleware.base import BaseHTTPMiddleware
@@ -74,12 +89,27 @@ def create_app() -> FastAPI:
     if not secret_key:
         secret_path = os.getenv("SESSION_SECRET_FILE", os.path.join("data", "session_secret.key"))
         secret_key = _load_or_create_secret(secret_path)
+    app.state.secret_key = secret_key  # aussi pour signer les liens d'abonnement calendrier
     app.add_middleware(
         SessionMiddleware,
         secret_key=secret_key,
         same_site="lax",
         session_cookie="cousinade_session",
     )
+
+    # 2) Compression (gzip / Brotli) des pages HTML, réglable par variables d'env
+    app.state.compression_stats = CompressionStats()
+    app.state.gzip_level = int(os.getenv("COMPRESSION_GZIP_LEVEL", "6"))  # aussi pour les fragments précompressés
+    app.add_middleware(
+        CompressionMiddleware,
+        minimum_size=int(os.getenv("COMPRESSION_MIN_SIZE", "1024")),
+        gzip_level=app.state.gzip_level,
+        brotli_quality=int(os.getenv("COMPRESSION_BROTLI_QUALITY", "5")),
+        stats=app.state.compression_stats,
+    )
+
+    # 3) Métriques en dernier : le plus à l'extérieur, mesure la requête complète
+    app.add_middleware(MetricsMiddleware, query_budget=int(os.getenv("SQL_QUERY_BUDGET", "30")))
     return app
 
 app = create_app()
@@ -91,8 +121,33 @@ PHOTOS_THUMB = os.path.join(MEDIA_ROOT, "photos/thumb")
 os.makedirs(PHOTOS_FULL, exist_ok=True)
 os.makedirs(PHOTOS_THUMB, exist_ok=True)
 
+# ---- Versions redimensionnées à la demande : /media/photos/<largeur>/<stored_name>
+# Déclarée avant le montage /media ; le convertisseur :int laisse passer full/ et thumb/ au StaticFiles.
+RENDITION_WIDTHS = tuple(int(w) for w in os.getenv("RENDITION_WIDTHS", "200,400,800,1200,1600").split(",") if w.strip())
+renditions = RenditionCache(
+    PHOTOS_FULL,
+    os.getenv("RENDITION_CACHE_DIR", os.path.join(MEDIA_ROOT, "cache")),
+    RENDITION_WIDTHS,
+    quota_bytes=int(os.getenv("RENDITION_CACHE_MB", "512")) * 1024 * 1024,
+)
+
+@app.get("/media/photos/{width:int}/{stored_name:path}")
+async def photo_rendition(width: int, stored_name: str):
+    if width not in renditions.widths:
+        raise HTTPException(status_code=404)
+    try:
+        path = await renditions.get(width, stored_name)
+    except Exception:
+        # Version full tronquée ou illisible (journalisée, comptée dans stats["errors"]) : 404 plutôt que 500
+        raise HTTPException(status_code=404)
+    if path is None:
+        raise HTTPException(status_code=404)
+    # stored_name est un uuid : le contenu d'une URL ne change jamais
+    return FileResponse(path, headers={"Cache-Control": "public, max-age=31536000, immutable"})
+
 app.mount("/media", StaticFiles(directory=MEDIA_ROOT), name="media")
-app.mount("/static", StaticFiles(directory="static"), name="static")
+precompress_static("static")
+app.mount("/static", PrecompressedStaticFiles(directory="static"), name="static")
 
 MAX_FULL = 2048   # côté max pour la version "full"
 MAX_THUMB = 400   # côté max pour la vignette
@@ -105,11 +160,13 @@ def _safe_ext(mime: str, fallback=".jpg"):
         "image/heic": ".jpg", "image/heif": ".jpg"  # converties via pillow-heif si dispo
     }.get(mime.lower(), fallback)
 
-def _save_resized(img: Image.Image, dest: str, max_side: int):
+def _save_resized(img: Image.Image, dest: str, max_side: int, exif: bytes | None = None):
     im = ImageOps.exif_transpose(img)  # respecte l’orientation EXIF
     im.thumbnail((max_side, max_side)) # conserve le ratio
     fmt = "JPEG" if dest.lower().endswith(".jpg") else "PNG" if dest.lower().endswith(".png") else "WEBP"
     save_kwargs = {"optimize": True, "quality": 88} if fmt in ("JPEG","WEBP") else {}
+    if exif:
+        save_kwargs["exif"] = exif  # garde date/appareil dans la version full (sans GPS)
     im.save(dest, fmt, **save_kwargs)
     return im.size  # (w, h)
 
@@ -117,6 +174,8 @@ def _save_resized(img: Image.Image, dest: str, max_side: int):
 
 def update_bdd(engine):
     insp = inspect(engine)
+    if not insp.has_table('members'):
+        return  # base neuve : create_all s'en charge
     cols = {c['name'] for c in insp.get_columns('members')}
     if 'address' not in cols:
         with engine.begin() as conn: conn.execute(text("ALTER TABLE members ADD COLUMN address VARCHAR(255);"))
@@ -124,13 +183,46 @@ def update_bdd(engine):
         with engine.begin() as conn: conn.execute(text("ALTER TABLE members ADD COLUMN postal_code VARCHAR(20);"))
     if 'city' not in cols:
         with engine.begin() as conn: conn.execute(text("ALTER TABLE members ADD COLUMN city VARCHAR(80);"))
-
-
-DATABASE_URL = "sqlite:///./cousinade.db"  # passe à Postgres si besoin
+    if 'email_norm' not in cols:
+        with engine.begin() as conn:
+            conn.execute(text("ALTER TABLE members ADD COLUMN email_norm VARCHAR(255);"))
+            rows = conn.execute(text("SELECT id, email FROM members WHERE email IS NOT NULL")).all()
+            if rows:
+                conn.execute(text("UPDATE members SET email_norm = :norm WHERE id = :id"),
+                             [{"id": r.id, "norm": normalize_email(r.email)} for r in rows])
+    with engine.begin() as conn:
+        conn.execute(text("CREATE INDEX IF NOT EXISTS ix_members_email_norm ON members (email_norm);"))
+
+    if insp.has_table('photos'):
+        pcols = {c['name'] for c in insp.get_columns('photos')}
+        with engine.begin() as conn:
+            if 'taken_at' not in pcols: conn.execute(text("ALTER TABLE photos ADD COLUMN taken_at DATETIME;"))
+            if 'camera' not in pcols: conn.execute(text("ALTER TABLE photos ADD COLUMN camera VARCHAR(120);"))
+            if 'orientation' not in pcols: conn.execute(text("ALTER TABLE photos ADD COLUMN orientation INTEGER;"))
+            if 'exif_scanned' not in pcols: conn.execute(text("ALTER TABLE photos ADD COLUMN exif_scanned BOOLEAN NOT NULL DEFAULT 0;"))
+            if 'placeholder' not in pcols: conn.execute(text("ALTER TABLE photos ADD COLUMN placeholder TEXT;"))
+            conn.execute(text("CREATE INDEX IF NOT EXISTS ix_photos_taken_at ON photos (taken_at);"))
+
+    if insp.has_table('person_attendance'):
+        acols = {c['name'] for c in insp.get_columns('person_attendance')}
+        with engine.begin() as conn:
+            if 'responded_by' not in acols: conn.execute(text("ALTER TABLE person_attendance ADD COLUMN responded_by INTEGER REFERENCES members(id);"))
+            conn.execute(text("CREATE INDEX IF NOT EXISTS ix_person_attendance_slot_present ON person_attendance (slot_id, present);"))
+
+    if insp.has_table('cache_versions'):
+        if 'updated_at' not in {c['name'] for c in insp.get_columns('cache_versions')}:
+            with engine.begin() as conn: conn.execute(text("ALTER TABLE cache_versions ADD COLUMN updated_at DATETIME;"))
+
+
+DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./cousinade.db")  # passe à Postgres si besoin
 engine = create_engine(DATABASE_URL, connect_args={"check_same_thread": False})
+instrument_engine(engine)
 SessionLocal = sessionmaker(bind=engine, autoflush=False, autocommit=False)
+track_changes(SessionLocal)
 update_bdd(engine)
 Base.metadata.create_all(bind=engine)
+ensure_cache_versions(engine)
+seed_change_log(engine)
 
 templates = Environment(loader=FileSystemLoader("templates"), autoescape=select_autoescape(['html', 'xml']))
 
@@ -191,6 +283,47 @@ def _member_to_vcard(member: Member) -> str:
     return "\r\n".join(lines) + "\r\n"
 
 
+# ---- Stats de compression (ratio + temps CPU, pour régler les niveaux)
+@app.get("/stats/compression")
+def compression_stats(request: Request, db: Session = Depends(get_db)):
+    user = get_current_user(request, db)
+    if not user:
+        return RedirectResponse(url="/login", status_code=303)
+    return JSONResponse(request.app.state.compression_stats.snapshot())
+
+
+# ---- Stats du cache de versions redimensionnées (succès / générations / évictions)
+@app.get("/stats/renditions")
+def rendition_stats(request: Request, db: Session = Depends(get_db)):
+    user = get_current_user(request, db)
+    if not user:
+        return RedirectResponse(url="/login", status_code=303)
+    return JSONResponse(renditions.snapshot())
+
+
+# ---- Métriques Prometheus (protégées par METRICS_TOKEN si défini)
+@app.get("/metrics")
+def metrics(request: Request):
+    token = os.getenv("METRICS_TOKEN")
+    if token and not secrets.compare_digest(request.headers.get("authorization", ""), f"Bearer {token}"):
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED)
+    body = render_prometheus(compression_lines(request.app.state.compression_stats.snapshot())
+                             + rendition_lines(renditions.snapshot()))
+    return PlainTextResponse(body, media_type="text/plain; version=0.0.4")
+
+
+# ---- Caches locaux au process, invalidés via cache_versions (cf. cachebus.py)
+_directory_cache = ProcessCache("directory", ("members",), max_entries=1)  # grille complète (q vide) seulement
+_household_cache = ProcessCache("household", ("members",), max_entries=2048)
+_rsvp_totals_cache = ProcessCache("rsvp_totals", ("rsvp",), max_entries=1)
+_catering_cache = ProcessCache("catering", ("rsvp", "members"), max_entries=1)
+_calendar_shared_cache = ProcessCache("calendar_shared", ("rsvp", "members"), max_entries=1)
+_calendar_cache = ProcessCache("calendar", ("rsvp", "members"), max_entries=2048)
+_calendar_body_cache = ProcessCache("calendar_body", ("rsvp", "members"), max_entries=1024,
+                                    max_bytes=int(os.getenv("CALENDAR_BODY_CACHE_MB", "64")) * 1024 * 1024)
+CALENDAR_HEAD = calendar_head("Cousinade")
+
+
 # ---- Annuaire
 @app.get("/", response_class=HTMLResponse)
 def directory(request: Request, q: str | None = None, db: Session = Depends(get_db)):
@@ -198,16 +331,38 @@ def directory(request: Request, q: str | None = None, db: Session = Depends(get_
     if not user : 
         return RedirectResponse(url="/login", status_code=303)
     
-    stmt = select(Member) #where( (Member.family_branch == 'cousin') )
-    if q:
-        like = f"%{q}%"
-        stmt = stmt.where(
-            (Member.first_name.ilike(like)) |
-            (Member.last_name.ilike(like))
-        )
-    members = db.scalars(stmt.order_by(Member.first_name, Member.last_name)).all()
-    tpl = templates.get_template("directory.html")
-    return tpl.render(request=request, members=members, q=q or "", user=user)
+    def render_grid():
+        stmt = select(Member) #where( (Member.family_branch == 'cousin') )
+        if q:
+            like = f"%{q}%"
+            stmt = stmt.where(
+                (Member.first_name.ilike(like)) |
+                (Member.last_name.ilike(like))
+            )
+        members = db.scalars(stmt.order_by(Member.first_name, Member.last_name)).all()
+        html = templates.get_template("_directory_grid.html").render(members=members)
+        return DeflateFragment(html.encode("utf-8"), level=request.app.state.gzip_level)
+
+    # La grille ne dépend pas de l'utilisateur : l'annuaire complet est rendu et compressé une fois
+    # par version de "members" ; les recherches (plus petites, valeurs arbitraires) ne sont pas gardées.
+    grid = _directory_cache.get(db, "all", render_grid) if not q else render_grid()
+
+    # En-tête et pied propres à l'utilisateur, rendus autour d'un marqueur
+    marker = "<!--cousinade-grid-->"
+    page = templates.get_template("directory.html").render(request=request, q=q or "", user=user,
+                                                            grid_html=Markup(marker))
+    head, tail = (part.encode("utf-8") for part in page.split(marker, 1))
+
+    if accepts_gzip(request.headers):
+        # gzip précompressé préféré à un br recalculé sur toute la grille à chaque requête ;
+        # le middleware laisse passer (Content-Encoding déjà posé) : seule la partie par utilisateur est compressée
+        t0 = time.thread_time()
+        body = gzip_join([head, grid, tail], level=request.app.state.gzip_level)
+        request.app.state.compression_stats.record("gzip", len(head) + len(grid.data) + len(tail), len(body),
+                                                   time.thread_time() - t0)
+        return Response(body, media_type="text/html; charset=utf-8",
+                        headers={"Content-Encoding": "gzip", "Vary": "Accept-Encoding"})
+    return HTMLResponse(head + grid.data + tail)
 
 
 # ---- Fiche
@@ -243,6 +398,16 @@ def member_vcard(request: Request, member_id: int, db: Session = Depends(get_db)
     headers = {"Content-Disposition": f"attachment; filename=\"{filename}\""}
     return Response(content=vcard_content, media_type="text/vcard", headers=headers)
 
+# ---- Synchro incrémentale : membres, liens, présences et photos modifiés depuis un jeton
+@app.get("/api/changes")
+def api_changes(request: Request, since: int | None = None, limit: int = 500, db: Session = Depends(get_db)):
+    user = get_current_user(request, db)
+    if not user:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED)
+    return JSONResponse(changes_since(db, since, limit=max(1, min(limit, 5000))),
+                        headers={"Cache-Control": "private, no-cache"})
+
+
 # ---- Edition via lien sécurisé
 @app.get("/edit", response_class=HTMLResponse)
 def edit_form(request: Request, db: Session = Depends(get_db)):
@@ -331,6 +496,7 @@ def save_form(request: Request, owner_id: int = Form(...), family_json: str = Fo
             if link["parent_id"] == data["owner"]["id"]: parent_id = owner.id
             ensure_parent_child(parent_id, child_id)
 
+        bump(db, "members")  # annuaire, foyers, tranches d'âge du rapport traiteur
         db.commit()
 
         return RedirectResponse(url=f"/member/{owner.id}", status_code=303)
@@ -343,16 +509,36 @@ def login_form(request: Request):
     return tpl.render(request=request, error=None)
 
 # ---- Login: traiter l'email
+# Limites en mémoire (par worker), vérifiées avant toute requête SQL :
+# - par adresse, tous les essais ;
+# - par IP, seulement les adresses introuvables : toute la famille partage l'IP du wifi au week-end
+login_ip_limiter = SlidingWindowLimiter(limit=int(os.getenv("LOGIN_RATE_IP", "20")), window=300)
+login_email_limiter = SlidingWindowLimiter(limit=int(os.getenv("LOGIN_RATE_EMAIL", "5")), window=300)
+
 @app.post("/login", response_class=HTMLResponse)
 def do_login(request: Request, email: str = Form(...), db: Session = Depends(get_db)):
-    email_norm = (email or "").strip().lower()
+    email_norm = normalize_email(email)
     if not email_norm:
         tpl = templates.get_template("login.html")
         return tpl.render(request=request, error="Merci d'indiquer votre email.")
 
-    # On cherche un membre avec cet email (insensible à la casse)
-    m = db.scalar(select(Member).where(Member.email.ilike(email_norm)))
+    ip_key, email_key = f"ip:{request.client.host if request.client else '?'}", f"email:{email_norm}"
+    refused = None
+    if login_ip_limiter.blocked(ip_key):
+        refused = (login_ip_limiter, ip_key)
+    elif not login_email_limiter.hit(email_key):
+        refused = (login_email_limiter, email_key)
+    if refused:
+        # Attente calculée sur le seul limiteur qui a refusé
+        wait = refused[0].retry_after(refused[1])
+        tpl = templates.get_template("login.html")
+        return HTMLResponse(tpl.render(request=request, error="Trop de tentatives, réessayez dans quelques minutes."),
+                            status_code=status.HTTP_429_TOO_MANY_REQUESTS, headers={"Retry-After": str(wait)})
+
+    # Recherche sur la colonne normalisée et indexée (insensible à la casse)
+    m = db.scalar(select(Member).where(Member.email_norm == email_norm).order_by(Member.id).limit(1))
     if not m:
+        login_ip_limiter.hit(ip_key)  # seuls les échecs comptent pour l'IP (énumération d'adresses)
         tpl = templates.get_template("login.html")
         return tpl.render(request=request, error="Adresse introuvable dans l'annuaire.")
     # OK: on met en session
@@ -366,18 +552,105 @@ def logout(request: Request):
     return RedirectResponse(url="/", status_code=303)
 
 
+def _parse_date(value: str | None) -> date | None:
+    if not value:
+        return None
+    try:
+        return date.fromisoformat(value)
+    except ValueError:
+        return None
+
+
+def _parse_int(value: str | None) -> int | None:
+    # Les <select> "Tous" envoient weekend= : vide ou invalide = pas de filtre
+    try:
+        return int(value) if value else None
+    except ValueError:
+        return None
+
+
+def _photo_filters(db: Session, weekend: int | None = None, date_from: date | None = None,
+                   date_to: date | None = None, uploader: int | None = None) -> list:
+    """Conditions sur la date de prise de vue (index ix_photos_taken_at) ; un week-end = [start_date, end_date]."""
+    conds = []
+    if uploader:
+        conds.append(Photo.member_id == uploader)
+    if weekend:
+        w = db.get(EventWeekend, weekend)
+        if w:
+            date_from = max(filter(None, [date_from, w.start_date]))
+            date_to = min(filter(None, [date_to, w.end_date]))
+    if date_from:
+        conds.append(Photo.taken_at >= datetime.datetime.combine(date_from, datetime.time.min))
+    if date_to:
+        conds.append(Photo.taken_at < datetime.datetime.combine(date_to + datetime.timedelta(days=1), datetime.time.min))
+    return conds
+
+
+def _photo_order(sort: str) -> list:
+    if sort == "uploaded":
+        return [desc(Photo.created_at)]
+    # Par défaut : date de prise de vue, les photos sans EXIF (vieux scans) en dernier
+    return [Photo.taken_at.desc().nulls_last(), desc(Photo.created_at)]
+
+
 # ---- Afficher la galerie
 @app.get("/photos", response_class=HTMLResponse)
-def photos_page(request: Request, db: Session = Depends(get_db)):
+def photos_page(request: Request, sort: str = "taken", weekend: str | None = None, uploader: str | None = None,
+                date_from: str | None = None, date_to: str | None = None, db: Session = Depends(get_db)):
     user = get_current_user(request, db)  # via ton cookie
     if not user:
         return RedirectResponse(url="/login", status_code=status.HTTP_303_SEE_OTHER)
 
+    weekend, uploader = _parse_int(weekend), _parse_int(uploader)
+    d_from, d_to = _parse_date(date_from), _parse_date(date_to)
     photos = db.scalars(
-        select(Photo).order_by(desc(Photo.created_at)).limit(300)  # paginate si besoin
+        select(Photo)
+        .where(*_photo_filters(db, weekend, d_from, d_to, uploader))
+        .order_by(*_photo_order(sort))
+        .limit(300)  # paginate si besoin
+    ).all()
+    weekends = db.scalars(select(EventWeekend).order_by(EventWeekend.start_date)).all()
+    uploaders = db.scalars(
+        select(Member).where(Member.id.in_(select(Photo.member_id).distinct())).order_by(Member.first_name)
     ).all()
     tpl = templates.get_template("photos.html")
-    return tpl.render(request=request, user=user, photos=photos)
+    return tpl.render(request=request, user=user, photos=photos, weekends=weekends, uploaders=uploaders,
+                      sort=sort, weekend=weekend, uploader=uploader, date_from=d_from, date_to=d_to,
+                      rendition_widths=renditions.widths, archive_query=_archive_query(request))
+
+
+def _archive_query(request: Request) -> str:
+    # Lien ZIP : mêmes filtres que la galerie, sans les champs laissés vides
+    params = [(k, v) for k, v in request.query_params.multi_items()
+              if v and k in ("sort", "weekend", "uploader", "date_from", "date_to")]
+    return urlencode(params)
+
+# ---- Téléchargement groupé (ZIP construit à la volée, mêmes filtres que la galerie)
+@app.get("/photos/archive.zip")
+def photos_archive(request: Request, sort: str = "taken", weekend: str | None = None, uploader: str | None = None,
+                   date_from: str | None = None, date_to: str | None = None, db: Session = Depends(get_db)):
+    user = get_current_user(request, db)
+    if not user:
+        return RedirectResponse(url="/login", status_code=status.HTTP_303_SEE_OTHER)
+
+    # On matérialise la liste avant de streamer : la session est fermée pendant l'envoi
+    rows = db.execute(
+        select(Photo.id, Photo.stored_name, Photo.taken_at, Photo.created_at, Member.first_name)
+        .join(Member, Member.id == Photo.member_id)
+        .where(*_photo_filters(db, _parse_int(weekend), _parse_date(date_from), _parse_date(date_to),
+                               _parse_int(uploader)))
+        .order_by(*_photo_order(sort))
+    ).all()
+    entries = []
+    for r in rows:
+        when = r.taken_at or r.created_at
+        ext = os.path.splitext(r.stored_name)[1]
+        arcname = f"{when:%Y-%m-%d}_{_slugify_filename(r.first_name or '', 'photo')}_{r.id}{ext}"
+        entries.append((os.path.join(PHOTOS_FULL, r.stored_name), arcname, when))
+
+    headers = {"Content-Disposition": 'attachment; filename="cousinade_photos.zip"'}
+    return StreamingResponse(stream_zip(entries), media_type="application/zip", headers=headers)
 
 # ---- Upload (multiple)
 @app.post("/photos/upload")
@@ -406,9 +679,18 @@ async def photos_upload(request: Request, files: List[UploadFile] = File(...), d
         content = await uf.read()
         try:
             with Image.open(io.BytesIO(content)) as img:
-                w_full, h_full = _save_resized(img, full_path, MAX_FULL)
+                with image_stage("decode"):
+                    img.load()
+                with image_stage("exif"):
+                    meta = extract_exif(img)
+                    exif_bytes = exif_for_rendition(img)
+                with image_stage("full"):
+                    w_full, h_full = _save_resized(img, full_path, MAX_FULL, exif=exif_bytes)
                 with Image.open(full_path) as im2:
-                    w_th, h_th = _save_resized(im2, th_path, MAX_THUMB)
+                    with image_stage("thumb"):
+                        w_th, h_th = _save_resized(im2, th_path, MAX_THUMB)
+                    with image_stage("placeholder"):
+                        placeholder = placeholder_data_uri(im2)
         except Exception:
             # Si Pillow ne sait pas lire, ignore ce fichier
             continue
@@ -418,10 +700,14 @@ async def photos_upload(request: Request, files: List[UploadFile] = File(...), d
             orig_name=uf.filename,
             stored_name=stored_rel,
             mime=mime,
-            width=w_full, height=h_full
+            width=w_full, height=h_full,
+            taken_at=meta["taken_at"], camera=meta["camera"], orientation=meta["orientation"],
+            exif_scanned=True,
+            placeholder=placeholder,
         )
         db.add(p)
 
+    bump(db, "photos")
     db.commit()
     return RedirectResponse(url="/photos", status_code=status.HTTP_303_SEE_OTHER)
 
@@ -443,6 +729,13 @@ def get_household(user: Member) -> list[Member]:
     return members
 
 
+def household_members(db: Session, user: Member) -> list[Member]:
+    """get_household() avec les ids en cache : une requête au lieu du parcours des relations."""
+    ids = _household_cache.get(db, user.id, lambda: [m.id for m in get_household(user)])
+    by_id = {m.id: m for m in db.scalars(select(Member).where(Member.id.in_(ids)))}
+    return [by_id[i] for i in ids if i in by_id]
+
+
 def ensure_rsvp_seed(db: Session):
     existing = db.scalar(select(func.count(EventSlot.id)))
     if existing and existing > 0:
@@ -472,6 +765,7 @@ def ensure_rsvp_seed(db: Session):
     for idx, (d, lbl) in enumerate(w2_slots):
         db.add(EventSlot(weekend_id=w2.id, date=d, label=lbl, order_index=idx))
 
+    bump(db, "rsvp")
     db.commit()
 
 # Page RSVP
@@ -484,7 +778,7 @@ def rsvp_page(request: Request, db: Session = Depends(get_db)):
     ensure_rsvp_seed(db)
 
     # Foyer
-    household = get_household(user)
+    household = household_members(db, user)
 
     # Week-ends et slots
     weekends = db.scalars(select(EventWeekend).order_by(EventWeekend.start_date)).all()
@@ -501,14 +795,15 @@ def rsvp_page(request: Request, db: Session = Depends(get_db)):
     present_map = {(a.person_id, a.slot_id): a.present for a in pa}
 
     # Totaux globaux par slot (tous foyers confondus)
-    totals = dict(db.execute(
-        select(PersonAttendance.slot_id, func.sum(case((PersonAttendance.present == True, 1), else_=0))).group_by(PersonAttendance.slot_id)).all())
+    totals = _rsvp_totals_cache.get(db, "totals", lambda: dict(db.execute(
+        select(PersonAttendance.slot_id, func.sum(case((PersonAttendance.present == True, 1), else_=0))).group_by(PersonAttendance.slot_id)).all()))
 
     household_ids = [m.id for m in household]
 
-    # Toutes présences des autres
+    # Toutes présences des autres (les réponses "absent" sont conservées avec present=False)
     pa_others = db.scalars(
-        select(PersonAttendance).where(PersonAttendance.person_id.not_in(household_ids))
+        select(PersonAttendance).where(PersonAttendance.person_id.not_in(household_ids),
+                                       PersonAttendance.present == True)
     ).all()
     others_present = {(a.person_id, a.slot_id) for a in pa_others}
 
@@ -537,7 +832,8 @@ def rsvp_page(request: Request, db: Session = Depends(get_db)):
                       present_map=present_map,
                       totals=totals,
                       others_present=others_present, 
-                      others_by_weekend=others_by_weekend)
+                      others_by_weekend=others_by_weekend,
+                      calendar_url=_calendar_url(request, user))
 
 
 @app.post("/rsvp/save")
@@ -548,7 +844,7 @@ async def rsvp_save(request: Request, db: Session = Depends(get_db)):
 
     ensure_rsvp_seed(db)
 
-    household = get_household(user)
+    household = household_members(db, user)
     person_ids = [m.id for m in household]
     slots = db.scalars(select(EventSlot)).all()
     form = await request.form()
@@ -560,15 +856,128 @@ async def rsvp_save(request: Request, db: Session = Depends(get_db)):
             checked = key in form  # HTML envoie la clé si cochée
             att = db.scalar(select(PersonAttendance)
                             .where(PersonAttendance.person_id==pid, PersonAttendance.slot_id==s.id))
-            if checked:
-                if not att:
-                    db.add(PersonAttendance(person_id=pid, slot_id=s.id, present=True))
-                else:
-                    att.present = True
+            # On garde une ligne present=False : distingue "absent" de "pas encore répondu"
+            if not att:
+                db.add(PersonAttendance(person_id=pid, slot_id=s.id, present=checked, responded_by=user.id))
             else:
-                if att:
-                    # soit on met False, soit on supprime — je supprime pour alléger
-                    db.delete(att)
+                att.present = checked
+                att.responded_by = user.id
 
+    bump(db, "rsvp")
     db.commit()
     return RedirectResponse(url="/rsvp", status_code=status.HTTP_303_SEE_OTHER)
+
+
+# ---- Calendrier (.ics) : week-ends, créneaux confirmés du foyer, anniversaires
+def _calendar_url(request: Request, user: Member) -> str:
+    base = str(request.url_for("calendar_ics"))
+    return f"{base}?member={user.id}&key={feed_key(request.app.state.secret_key, user.id)}"
+
+
+def _calendar_snapshot(db: Session, user: Member) -> dict:
+    """Parties du flux et ETag précalculés par version (members, rsvp) : partie commune une fois, foyer par membre.
+
+    La partie commune (anniversaires surtout) est gardée pliée, encodée et compressée en deflate :
+    un corps complet n'est qu'une concaténation, et gzip_join() évite de la recompresser.
+    """
+    changed_at = last_modified(db, "members", "rsvp")
+    stamp = ical_stamp(changed_at)  # DTSTAMP stable : même version => mêmes octets => même ETag
+
+    def compute_shared():
+        data = fold_lines(shared_events(db, stamp))
+        return {"fragment": DeflateFragment(data, level=app.state.gzip_level),
+                "digest": hashlib.sha256(data).hexdigest()}
+
+    def compute():
+        shared = _calendar_shared_cache.get(db, "events", compute_shared)
+        household = household_members(db, user)
+        names = {m.id: m.first_name for m in household}
+        own = fold_lines(household_events(db, stamp, list(names), names))
+        digest = hashlib.sha256(shared["digest"].encode() + own).hexdigest()
+        return {"shared": shared["fragment"], "own": own, "etag": f'"{digest[:32]}"',
+                "last_modified": (changed_at or datetime.datetime(1970, 1, 1)).replace(tzinfo=datetime.timezone.utc)}
+
+    return _calendar_cache.get(db, user.id, compute)
+
+
+def _calendar_body(db: Session, user: Member, snap: dict, encoding: str | None) -> bytes:
+    """Corps final par (membre, ETag, encodage), borné en octets ; construit sans plier ni recompresser."""
+    def build():
+        if encoding == "gzip":
+            return gzip_join([CALENDAR_HEAD, snap["shared"], snap["own"] + CALENDAR_TAIL], level=app.state.gzip_level)
+        return b"".join((CALENDAR_HEAD, snap["shared"].data, snap["own"], CALENDAR_TAIL))
+    return _calendar_body_cache.get(db, (user.id, snap["etag"], encoding), build)
+
+
+def _not_modified(request: Request, etag: str, modified: datetime.datetime) -> bool:
+    inm = request.headers.get("if-none-match")
+    if inm is not None:
+        # Comparaison faible : la compression transforme l'ETag en W/"..."
+        tags = {t.strip().removeprefix("W/") for t in inm.split(",")}
+        return "*" in tags or etag in tags
+    ims = request.headers.get("if-modified-since")
+    if ims:
+        try:
+            return modified <= parsedate_to_datetime(ims)
+        except (TypeError, ValueError):
+            return False
+    return False
+
+
+@app.get("/calendar.ics", name="calendar_ics")
+def calendar_ics(request: Request, member: int | None = None, key: str | None = None, db: Session = Depends(get_db)):
+    # Abonnement : ?member=&key= signés (les applis calendrier n'envoient pas le cookie) ; sinon la session
+    if member is not None:
+        user = db.get(Member, member) if check_feed_key(request.app.state.secret_key, member, key) else None
+        if not user:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND)
+    else:
+        user = get_current_user(request, db)
+        if not user:
+            return RedirectResponse(url="/login", status_code=status.HTTP_303_SEE_OTHER)
+
+    ensure_rsvp_seed(db)
+    snap = _calendar_snapshot(db, user)
+    # gzip dès qu'il est accepté (même avec br) : le corps en cache est servi tel quel, sans recompression
+    encoding = "gzip" if accepts_gzip(request.headers) else None
+    headers = {"ETag": f"W/{snap['etag']}" if encoding else snap["etag"],  # faible si compressé, comme le middleware
+               "Last-Modified": format_datetime(snap["last_modified"], usegmt=True),
+               "Cache-Control": "private, max-age=300",
+               "Vary": "Accept-Encoding"}
+    if _not_modified(request, snap["etag"], snap["last_modified"]):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    if encoding:
+        headers["Content-Encoding"] = "gzip"  # déjà compressé : le middleware laisse passer
+    body = _calendar_body(db, user, snap, encoding)
+    return Response(body, media_type="text/calendar; charset=utf-8",
+                    headers={**headers, "Content-Disposition": 'inline; filename="cousinade.ics"'})
+
+
+# ---- Rapport traiteur (effectifs par repas et tranche d'âge), en cache jusqu'au prochain rsvp_save
+def _catering_report(db: Session) -> dict:
+    ensure_rsvp_seed(db)
+    return _catering_cache.get(db, "report", lambda: {"rows": catering_rows(db)})
+
+
+@app.get("/rsvp/report.csv")
+def rsvp_report_csv(request: Request, db: Session = Depends(get_db)):
+    user = get_current_user(request, db)
+    if not user:
+        return RedirectResponse(url="/login", status_code=status.HTTP_303_SEE_OTHER)
+    rows = _catering_report(db)["rows"]
+    headers = {"Content-Disposition": 'attachment; filename="cousinade_traiteur.csv"'}
+    return StreamingResponse(iter_csv(rows), media_type="text/csv; charset=utf-8", headers=headers)
+
+
+@app.get("/rsvp/report.xlsx")
+def rsvp_report_xlsx(request: Request, db: Session = Depends(get_db)):
+    user = get_current_user(request, db)
+    if not user:
+        return RedirectResponse(url="/login", status_code=status.HTTP_303_SEE_OTHER)
+    report = _catering_report(db)
+    if "xlsx" not in report:
+        report["xlsx"] = build_xlsx(report["rows"])
+    headers = {"Content-Disposition": 'attachment; filename="cousinade_traiteur.xlsx"'}
+    return Response(content=report["xlsx"],
+                    media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+                    headers=headers)
@@ -0,0 +1,234 @@
+# app/metrics.py
+# Instrumentation : latence par route, requêtes SQL par requête HTTP, étapes Pillow -> /metrics (format Prometheus)
+
+import time, logging, threading, contextvars
+from contextlib import contextmanager
+
+from sqlalchemy import event
+
+log = logging.getLogger("cousinade.metrics")
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500)
+
+
+class Histogram:
+    def __init__(self, name: str, help_text: str, buckets: tuple, labelnames: tuple):
+        self.name, self.help, self.buckets, self.labelnames = name, help_text, buckets, labelnames
+        self._lock = threading.Lock()
+        self._series: dict[tuple, list] = {}  # labels -> [counts par bucket..., somme, total]
+
+    def observe(self, value: float, **labels):
+        key = tuple(labels.get(n, "") for n in self.labelnames)
+        with self._lock:
+            s = self._series.get(key)
+            if s is None:
+                s = self._series[key] = [0] * len(self.buckets) + [0.0, 0]
+            for i, b in enumerate(self.buckets):
+                if value <= b:
+                    s[i] += 1
+            s[-2] += value
+            s[-1] += 1
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key, s in sorted(self._series.items()):
+                base = ",".join(f'{n}="{_escape(v)}"' for n, v in zip(self.labelnames, key))
+                sep = "," if base else ""
+                for b, count in zip(self.buckets, s):
+                    lines.append(f'{self.name}_bucket{{{base}{sep}le="{b}"}} {count}')
+                lines.append(f'{self.name}_bucket{{{base}{sep}le="+Inf"}} {s[-1]}')
+                lines.append(f"{self.name}_sum{{{base}}} {s[-2]:.6f}")
+                lines.append(f"{self.name}_count{{{base}}} {s[-1]}")
+        return lines
+
+
+class Counter:
+    def __init__(self, name: str, help_text: str, labelnames: tuple):
+        self.name, self.help, self.labelnames = name, help_text, labelnames
+        self._lock = threading.Lock()
+        self._values: dict[tuple, float] = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = tuple(labels.get(n, "") for n in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, v in sorted(self._values.items()):
+                base = ",".join(f'{n}="{_escape(v2)}"' for n, v2 in zip(self.labelnames, key))
+                lines.append(f"{self.name}{{{base}}} {v}")
+        return lines
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", r"\\").replace('"', r"\"").replace("\n", r"\n")
+
+
+# ---- Registre global (un par process)
+REQUEST_LATENCY = Histogram("cousinade_request_duration_seconds", "Durée des requêtes HTTP par route.",
+                            LATENCY_BUCKETS, ("method", "route", "status"))
+REQUEST_QUERIES = Histogram("cousinade_request_sql_queries", "Nombre de requêtes SQL par requête HTTP.",
+                            QUERY_BUCKETS, ("method", "route"))
+REQUEST_SQL_TIME = Histogram("cousinade_request_sql_duration_seconds", "Temps SQL cumulé par requête HTTP.",
+                             LATENCY_BUCKETS, ("method", "route"))
+IMAGE_STAGE = Histogram("cousinade_image_stage_duration_seconds", "Durée des étapes de traitement d'image (Pillow).",
+                        LATENCY_BUCKETS, ("stage",))
+QUERY_BUDGET_EXCEEDED = Counter("cousinade_sql_query_budget_exceeded_total",
+                                "Requêtes HTTP ayant dépassé le budget de requêtes SQL.", ("method", "route"))
+
+CACHE_REQUESTS = Counter("cousinade_cache_requests_total", "Accès aux caches locaux au process.", ("cache", "result"))
+
+REGISTRY = [REQUEST_LATENCY, REQUEST_QUERIES, REQUEST_SQL_TIME, IMAGE_STAGE, QUERY_BUDGET_EXCEEDED, CACHE_REQUESTS]
+
+
+# ---- Comptage SQL par requête HTTP
+class _SQLStats:
+    __slots__ = ("count", "seconds")
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+
+
+# L'objet est posé par le middleware ; les routes sync tournent dans un thread
+# qui reçoit une copie du contexte, donc elles incrémentent le même objet.
+_current_sql: contextvars.ContextVar[_SQLStats | None] = contextvars.ContextVar("cousinade_sql", default=None)
+
+
+def instrument_engine(engine) -> None:
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("cousinade_query_start", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        started = conn.info["cousinade_query_start"].pop()
+        stats = _current_sql.get()
+        if stats is not None:
+            stats.count += 1
+            stats.seconds += time.perf_counter() - started
+
+    @event.listens_for(engine, "handle_error")
+    def _error(exception_context):
+        # Requête en échec : after_cursor_execute n'est pas appelé, on dépile ici
+        conn = exception_context.connection
+        starts = conn.info.get("cousinade_query_start") if conn is not None else None
+        if starts:
+            started = starts.pop()
+            stats = _current_sql.get()
+            if stats is not None:
+                stats.count += 1
+                stats.seconds += time.perf_counter() - started
+
+
+@contextmanager
+def image_stage(stage: str):
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        IMAGE_STAGE.observe(time.perf_counter() - t0, stage=stage)
+
+
+MOUNTED_PREFIXES = ("media", "static")
+UNMATCHED_ROUTE = "<unmatched>"
+
+
+def _route_label(scope) -> str:
+    route = scope.get("route")
+    if route is not None and getattr(route, "path", None):
+        return route.path
+    # Montages connus regroupés ; tout le reste (404, scanners) sous une seule étiquette,
+    # sinon chaque chemin inventé créerait de nouvelles séries
+    first = scope.get("path", "/").strip("/").split("/", 1)[0]
+    return f"/{first}/*" if first in MOUNTED_PREFIXES else UNMATCHED_ROUTE
+
+
+class MetricsMiddleware:
+    """Middleware ASGI : latence, nombre et temps des requêtes SQL par route.
+
+    Un avertissement est journalisé quand une requête HTTP dépasse `query_budget` requêtes SQL
+    (typiquement un N+1 qui vient d'apparaître).
+    """
+
+    def __init__(self, app, query_budget: int = 30):
+        self.app = app
+        self.query_budget = query_budget
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = _SQLStats()
+        token = _current_sql.set(stats)
+        status_code = 500
+        t0 = time.perf_counter()
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - t0
+            _current_sql.reset(token)
+            method, route = scope.get("method", ""), _route_label(scope)
+            REQUEST_LATENCY.observe(elapsed, method=method, route=route, status=str(status_code))
+            REQUEST_QUERIES.observe(stats.count, method=method, route=route)
+            REQUEST_SQL_TIME.observe(stats.seconds, method=method, route=route)
+            if self.query_budget and stats.count > self.query_budget:
+                QUERY_BUDGET_EXCEEDED.inc(method=method, route=route)
+                log.warning("%s %s: %d requêtes SQL (budget %d, %.1f ms SQL, %.1f ms total)",
+                            method, scope.get("path"), stats.count, self.query_budget,
+                            stats.seconds * 1000, elapsed * 1000)
+
+
+def render_prometheus(extra: list[str] | None = None) -> str:
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    lines.extend(extra or [])
+    return "\n".join(lines) + "\n"
+
+
+def compression_lines(snapshot: dict) -> list[str]:
+    """Traduit CompressionStats.snapshot() en compteurs Prometheus."""
+    lines = []
+    for key, help_text in (("responses", "Réponses compressées."),
+                           ("raw_bytes", "Octets avant compression."),
+                           ("compressed_bytes", "Octets après compression."),
+                           ("cpu_seconds", "Temps CPU passé à compresser.")):
+        name = f"cousinade_compression_{key}_total"
+        lines += [f"# HELP {name} {help_text}", f"# TYPE {name} counter"]
+        for enc, s in snapshot["encodings"].items():
+            lines.append(f'{name}{{encoding="{enc}"}} {s[key]}')
+    lines += ["# HELP cousinade_compression_skipped_total Réponses non compressées (trop petites ou type exclu).",
+              "# TYPE cousinade_compression_skipped_total counter",
+              f"cousinade_compression_skipped_total {snapshot['skipped']}"]
+    return lines
+
+
+def rendition_lines(snapshot: dict) -> list[str]:
+    """Traduit RenditionCache.snapshot() en métriques Prometheus."""
+    lines = ["# HELP cousinade_rendition_requests_total Accès au cache de versions redimensionnées.",
+             "# TYPE cousinade_rendition_requests_total counter"]
+    for result in ("hits", "misses", "coalesced", "errors"):
+        lines.append(f'cousinade_rendition_requests_total{{result="{result}"}} {snapshot[result]}')
+    lines += ["# HELP cousinade_rendition_evictions_total Fichiers supprimés pour respecter le quota.",
+              "# TYPE cousinade_rendition_evictions_total counter",
+              f"cousinade_rendition_evictions_total {snapshot['evictions']}",
+              "# HELP cousinade_rendition_cache_bytes Taille du cache disque (vue de ce worker).",
+              "# TYPE cousinade_rendition_cache_bytes gauge",
+              f"cousinade_rendition_cache_bytes {snapshot['bytes']}",
+              "# HELP cousinade_rendition_cache_quota_bytes Quota du cache disque.",
+              "# TYPE cousinade_rendition_cache_quota_bytes gauge",
+              f"cousinade_rendition_cache_quota_bytes {snapshot['quota_bytes']}"]
+    return lines
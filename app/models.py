@@ -1,10 +1,15 @@
 # app/models.py
 from datetime import datetime, date
-from sqlalchemy import Column, Integer, String, Date, DateTime, Boolean, ForeignKey, UniqueConstraint, Text
-from sqlalchemy.orm import declarative_base, relationship
+from sqlalchemy import Column, Integer, String, Date, DateTime, Boolean, ForeignKey, UniqueConstraint, Index, Text
+from sqlalchemy.orm import declarative_base, relationship, validates
 
 Base = declarative_base()
 
+def normalize_email(email: str | None) -> str | None:
+    """Forme canonique pour la recherche (login, dédoublonnage) : sans espaces, en minuscules."""
+    norm = (email or "").strip().lower()
+    return norm or None
+
 class Member(Base):
     __tablename__ = "members"
     id = Column(Integer, primary_key=True)
@@ -13,6 +18,7 @@ class Member(Base):
     last_name = Column(String(80), nullable=False)
     birth_date = Column(Date, nullable=True)
     email = Column(String(255), nullable=True, unique=False)
+    email_norm = Column(String(255), nullable=True, index=True)  # tenu à jour par validate_email
     phone = Column(String(50), nullable=True)
     address = Column(String(255), nullable=True)
     postal_code = Column(String(20), nullable=True)
@@ -38,6 +44,12 @@ class Member(Base):
     couples_b = relationship("Couple", foreign_keys="Couple.partner_b_id",
                              back_populates="partner_b", cascade="all, delete-orphan")
 
+    @validates("email")
+    def validate_email(self, key, value):
+        # Toute écriture d'email (save_form, import CSV...) met à jour la colonne indexée
+        self.email_norm = normalize_email(value)
+        return value
+
 class ParentChild(Base):
     __tablename__ = "parent_child"
     id = Column(Integer, primary_key=True)
@@ -79,10 +91,12 @@ class PersonAttendance(Base):
     id = Column(Integer, primary_key=True)
     person_id = Column(Integer, ForeignKey("members.id"), nullable=False)
     slot_id = Column(Integer, ForeignKey("event_slots.id"), nullable=False)
-    present = Column(Boolean, default=True, nullable=False)  # on garde True/False (ou bien on ne stocke que True)
-    __table_args__ = (UniqueConstraint('person_id', 'slot_id', name='uq_person_slot'),)
+    present = Column(Boolean, default=True, nullable=False)  # False = a répondu "absent" (ligne conservée)
+    responded_by = Column(Integer, ForeignKey("members.id"), nullable=True)  # membre qui a enregistré (= foyer)
+    __table_args__ = (UniqueConstraint('person_id', 'slot_id', name='uq_person_slot'),
+                      Index('ix_person_attendance_slot_present', 'slot_id', 'present'),)
 
-    person = relationship("Member")
+    person = relationship("Member", foreign_keys=[person_id])
     slot = relationship("EventSlot")
 
 class Photo(Base):
@@ -95,5 +109,29 @@ class Photo(Base):
     width = Column(Integer, nullable=True)
     height = Column(Integer, nullable=True)
     created_at = Column(DateTime, default=datetime.utcnow)
+    # EXIF (extrait à l'upload ou par backfill_exif.py)
+    taken_at = Column(DateTime, nullable=True, index=True)  # date de prise de vue
+    camera = Column(String(120), nullable=True)
+    orientation = Column(Integer, nullable=True)             # tag EXIF 1..8 de l'original
+    exif_scanned = Column(Boolean, default=False, nullable=False)
+    placeholder = Column(Text, nullable=True)  # data URI WebP 16px (LQIP) affiché avant la vignette
 
     member = relationship("Member")
+
+class CacheVersion(Base):
+    # Compteurs de version partagés entre workers : un write incrémente, les caches locaux comparent
+    __tablename__ = "cache_versions"
+    name = Column(String(40), primary_key=True)   # members | rsvp | photos
+    version = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime, nullable=True)  # date du dernier bump -> Last-Modified des flux (calendrier)
+
+class ChangeLog(Base):
+    # Journal compacté pour /api/changes : une ligne par entité, déplacée en tête (nouveau seq) à chaque écriture
+    __tablename__ = "change_log"
+    seq = Column(Integer, primary_key=True)                 # jeton de synchro, jamais réutilisé (AUTOINCREMENT)
+    entity = Column(String(20), nullable=False)              # members | parent_child | couples | attendance | photos
+    entity_id = Column(Integer, nullable=False)
+    deleted = Column(Boolean, default=False, nullable=False) # True = tombstone
+    changed_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+    __table_args__ = (UniqueConstraint('entity', 'entity_id', name='uq_change_log_entity'),
+                      {"sqlite_autoincrement": True})
@@ -0,0 +1,83 @@
+# app/photo_meta.py
+# Métadonnées EXIF des photos (date de prise de vue, appareil, orientation)
+# Module sans dépendance à main.py : utilisable depuis les workers du backfill.
+
+import io, base64, datetime
+
+from PIL import Image
+
+TAG_ORIENTATION = 0x0112
+TAG_MAKE = 0x010F
+TAG_MODEL = 0x0110
+TAG_DATETIME = 0x0132
+IFD_EXIF = 0x8769
+IFD_GPS = 0x8825
+TAG_DATETIME_ORIGINAL = 0x9003
+TAG_DATETIME_DIGITIZED = 0x9004
+
+
+def _parse_exif_datetime(value) -> datetime.datetime | None:
+    if not value:
+        return None
+    if isinstance(value, bytes):
+        value = value.decode("ascii", "ignore")
+    value = str(value).strip().strip("\x00")
+    for fmt in ("%Y:%m:%d %H:%M:%S", "%Y-%m-%d %H:%M:%S", "%Y:%m:%d"):
+        try:
+            dt = datetime.datetime.strptime(value[:19], fmt)
+        except ValueError:
+            continue
+        # "0000:00:00 00:00:00" et autres valeurs bidon des vieux appareils
+        return dt if dt.year >= 1900 else None
+    return None
+
+
+def extract_exif(img: Image.Image) -> dict:
+    """Renvoie {"taken_at", "camera", "orientation"} (None si absent) à partir de l'image d'origine."""
+    try:
+        exif = img.getexif()
+    except Exception:
+        return {"taken_at": None, "camera": None, "orientation": None}
+    sub = exif.get_ifd(IFD_EXIF)
+
+    taken_at = (_parse_exif_datetime(sub.get(TAG_DATETIME_ORIGINAL))
+                or _parse_exif_datetime(sub.get(TAG_DATETIME_DIGITIZED))
+                or _parse_exif_datetime(exif.get(TAG_DATETIME)))
+
+    make = str(exif.get(TAG_MAKE) or "").strip().strip("\x00")
+    model = str(exif.get(TAG_MODEL) or "").strip().strip("\x00")
+    # Beaucoup d'appareils répètent la marque dans le modèle ("Canon" + "Canon EOS 80D")
+    camera = model if make and model.lower().startswith(make.lower()) else " ".join(p for p in (make, model) if p)
+
+    orientation = exif.get(TAG_ORIENTATION)
+    return {
+        "taken_at": taken_at,
+        "camera": camera[:120] or None,
+        "orientation": int(orientation) if isinstance(orientation, int) and 1 <= orientation <= 8 else None,
+    }
+
+
+def extract_exif_from_path(path: str) -> dict:
+    with Image.open(path) as img:
+        return extract_exif(img)
+
+
+def exif_for_rendition(img: Image.Image) -> bytes:
+    """EXIF à réécrire dans la version "full" : sans GPS, orientation remise à 1 (déjà appliquée)."""
+    # Copie : getexif() renvoie l'objet en cache que exif_transpose() relira ensuite
+    exif = Image.Exif()
+    exif.load(img.getexif().tobytes())
+    if IFD_GPS in exif:
+        del exif[IFD_GPS]
+    if TAG_ORIENTATION in exif:
+        exif[TAG_ORIENTATION] = 1
+    return exif.tobytes()
+
+
+def placeholder_data_uri(img: Image.Image, size: int = 16) -> str:
+    """Aperçu flou (LQIP) : WebP de `size` px max en data URI base64, ~150-300 octets, affiché pendant le chargement."""
+    im = img.convert("RGB")
+    im.thumbnail((size, size))
+    buf = io.BytesIO()
+    im.save(buf, "WEBP", quality=40, method=6)
+    return "data:image/webp;base64," + base64.b64encode(buf.getvalue()).decode("ascii")
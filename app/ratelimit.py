@@ -0,0 +1,57 @@
+# app/ratelimit.py
+# Limiteur à fenêtre glissante, en mémoire (par process)
+
+import time, threading
+from collections import deque
+
+
+class SlidingWindowLimiter:
+    """Au plus `limit` essais par `window` secondes et par clé (IP, adresse email...)."""
+
+    def __init__(self, limit: int, window: float, max_keys: int = 10000):
+        self.limit = limit
+        self.window = window
+        self.max_keys = max_keys
+        self._hits: dict[str, deque] = {}
+        self._lock = threading.Lock()
+
+    def hit(self, key: str) -> bool:
+        """Enregistre un essai ; renvoie False si la clé a dépassé sa limite (l'essai n'est pas compté)."""
+        now = time.monotonic()
+        with self._lock:
+            q = self._hits.get(key)
+            if q is None:
+                if len(self._hits) >= self.max_keys:
+                    self._prune(now)
+                q = self._hits[key] = deque()
+            while q and q[0] <= now - self.window:
+                q.popleft()
+            if len(q) >= self.limit:
+                return False
+            q.append(now)
+            return True
+
+    def blocked(self, key: str) -> bool:
+        """Vrai si la clé a atteint sa limite, sans enregistrer d'essai (pour ne compter que les échecs)."""
+        now = time.monotonic()
+        with self._lock:
+            q = self._hits.get(key)
+            if not q:
+                return False
+            while q and q[0] <= now - self.window:
+                q.popleft()
+            return len(q) >= self.limit
+
+    def retry_after(self, key: str) -> int:
+        with self._lock:
+            q = self._hits.get(key)
+            if not q:
+                return 0
+            return max(0, int(q[0] + self.window - time.monotonic()) + 1)
+
+    def _prune(self, now: float):
+        for key in [k for k, q in self._hits.items() if not q or q[-1] <= now - self.window]:
+            del self._hits[key]
+        # Toujours plein (attaque distribuée) : on oublie les clés les plus anciennes
+        while len(self._hits) >= self.max_keys:
+            del self._hits[next(iter(self._hits))]
@@ -0,0 +1,170 @@
+# app/renditions.py
+# Versions redimensionnées à la demande, en cache disque LRU sous quota
+
+import os, asyncio, logging, threading
+from collections import OrderedDict
+
+import anyio
+from PIL import Image
+
+from .metrics import image_stage
+
+log = logging.getLogger("cousinade.renditions")
+
+
+class RenditionCache:
+    """Génère `largeur/stored_name` depuis la version full au premier accès, puis le sert depuis le disque.
+
+    - largeurs limitées à `widths` (pas de génération arbitraire) ;
+    - requêtes simultanées sur la même clé fusionnées : une seule génération ;
+    - éviction LRU dès que le cache dépasse `quota_bytes`.
+
+    L'index LRU est propre au worker (reconstruit au démarrage depuis les mtimes) ; un fichier
+    écrit par un autre worker est adopté au premier accès, un fichier évincé ailleurs est retiré
+    de l'index. Le quota est donc respecté à peu près, pas à l'octet près.
+    """
+
+    def __init__(self, source_dir: str, cache_dir: str, widths: tuple[int, ...], quota_bytes: int, quality: int = 85):
+        self.source_dir = os.path.abspath(source_dir)
+        self.cache_dir = os.path.abspath(cache_dir)
+        self.widths = tuple(sorted(widths))
+        self.quota_bytes = quota_bytes
+        self.quality = quality
+        self.stats = {"hits": 0, "misses": 0, "coalesced": 0, "evictions": 0, "errors": 0}
+        self._index: OrderedDict[str, int] = OrderedDict()  # chemin -> taille, du plus ancien au plus récent
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._inflight: dict[str, asyncio.Future] = {}
+        os.makedirs(self.cache_dir, exist_ok=True)
+        self._load_index()
+
+    def _load_index(self):
+        found = []
+        for root, _dirs, files in os.walk(self.cache_dir):
+            for name in files:
+                path = os.path.join(root, name)
+                if name.endswith(".tmp"):
+                    os.remove(path)
+                    continue
+                st = os.stat(path)
+                found.append((st.st_mtime, path, st.st_size))
+        for _mtime, path, size in sorted(found):
+            self._index[path] = size
+            self._bytes += size
+
+    def source_path(self, stored_name: str) -> str | None:
+        path = os.path.abspath(os.path.join(self.source_dir, stored_name))
+        if not path.startswith(self.source_dir + os.sep) or not os.path.isfile(path):
+            return None
+        return path
+
+    async def get(self, width: int, stored_name: str) -> str | None:
+        """Chemin de la version `width` (générée si besoin), ou None si la source n'existe pas."""
+        # isfile / stat dans le threadpool : ne pas bloquer la boucle sur un disque lent
+        found = await anyio.to_thread.run_sync(self._lookup, width, stored_name)
+        if found is None:
+            return None
+        src, dest, size = found
+
+        # Index du worker, puis disque : un autre worker a pu écrire (ou évincer) le fichier
+        with self._lock:
+            if size is not None:
+                if dest not in self._index:
+                    self._index[dest] = size
+                    self._bytes += size
+                self._index.move_to_end(dest)
+                self.stats["hits"] += 1
+                return dest
+            if dest in self._index:
+                self._bytes -= self._index.pop(dest)
+
+        pending = self._inflight.get(dest)
+        if pending is not None:
+            self.stats["coalesced"] += 1
+            try:
+                return await asyncio.shield(pending)
+            except asyncio.CancelledError:
+                task = asyncio.current_task()
+                if not pending.cancelled() or getattr(task, "cancelling", lambda: 0)():
+                    raise
+                # La requête qui générait a été annulée (client parti) : on reprend à notre compte
+                return await self.get(width, stored_name)
+
+        self.stats["misses"] += 1
+        fut = asyncio.get_running_loop().create_future()
+        self._inflight[dest] = fut
+        try:
+            size = await anyio.to_thread.run_sync(self._render, src, dest, width)
+            with self._lock:
+                self._bytes -= self._index.pop(dest, 0)
+                self._index[dest] = size
+                self._bytes += size
+            await anyio.to_thread.run_sync(self._evict)
+            fut.set_result(dest)
+            return dest
+        except BaseException as exc:
+            if not fut.done():
+                if isinstance(exc, Exception):
+                    self.stats["errors"] += 1
+                    log.warning("renditions: %s (%d px) impossible : %r", stored_name, width, exc)
+                    fut.set_exception(exc)
+                    fut.exception()  # marque l'exception comme lue s'il n'y a pas d'autre attente
+                else:
+                    fut.cancel()  # annulation : les requêtes en attente réessaient au lieu de rester bloquées
+            raise
+        finally:
+            self._inflight.pop(dest, None)
+
+    def _lookup(self, width: int, stored_name: str) -> tuple[str, str, int | None] | None:
+        """(source, destination, taille de la destination si elle existe déjà), ou None sans source."""
+        src = self.source_path(stored_name)
+        if src is None:
+            return None
+        dest = os.path.join(self.cache_dir, str(width), os.path.relpath(src, self.source_dir))
+        try:
+            return src, dest, os.stat(dest).st_size
+        except FileNotFoundError:
+            return src, dest, None
+
+    def _render(self, src: str, dest: str, width: int) -> int:
+        os.makedirs(os.path.dirname(dest), exist_ok=True)
+        tmp = f"{dest}.{os.getpid()}.tmp"
+        try:
+            with image_stage("rendition"), Image.open(src) as im:
+                # La version full est déjà orientée ; jamais d'agrandissement
+                if im.width > width:
+                    im.draft(im.mode, (width, width * im.height // im.width))  # décodage JPEG réduit
+                    im = im.resize((width, max(1, round(im.height * width / im.width))), Image.LANCZOS)
+                fmt = {".png": "PNG", ".webp": "WEBP"}.get(os.path.splitext(dest)[1].lower(), "JPEG")
+                kwargs = {"quality": self.quality, "optimize": True} if fmt in ("JPEG", "WEBP") else {"optimize": True}
+                if fmt == "JPEG":
+                    kwargs["progressive"] = True
+                im.save(tmp, fmt, **kwargs)
+        except BaseException:
+            # Source tronquée ou illisible : pas de .tmp à moitié écrit laissé derrière
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            raise
+        os.replace(tmp, dest)
+        return os.path.getsize(dest)
+
+    def _evict(self):
+        with self._lock:
+            victims = []
+            while self._bytes > self.quota_bytes and len(self._index) > 1:
+                path, size = self._index.popitem(last=False)
+                self._bytes -= size
+                victims.append(path)
+            self.stats["evictions"] += len(victims)
+        for path in victims:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+        if victims:
+            log.info("renditions: %d fichier(s) évincé(s), %d octets en cache", len(victims), self._bytes)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return dict(self.stats, entries=len(self._index), bytes=self._bytes, quota_bytes=self.quota_bytes,
+                        widths=list(self.widths))
@@ -0,0 +1,144 @@
+# app/reports.py
+# Rapport traiteur : effectifs par créneau et tranche d'âge, calculés en SQL
+
+import io, csv, zipfile
+from xml.sax.saxutils import escape
+
+from sqlalchemy import select, func, case, and_, exists, Integer, cast, literal, true
+from sqlalchemy.orm import Session
+
+from .models import Member, EventWeekend, EventSlot, PersonAttendance
+
+# (libellé, âge min inclus, âge max inclus) — âge calculé au premier jour du week-end
+AGE_BRACKETS = [
+    ("Bébés (0-2)", 0, 2),
+    ("Enfants (3-11)", 3, 11),
+    ("Ados (12-17)", 12, 17),
+    ("Adultes (18+)", 18, 200),
+]
+COLUMNS = (["Week-end", "Date", "Créneau"] + [b[0] for b in AGE_BRACKETS]
+           + ["Âge inconnu", "Total présents", "Foyers présents", "Foyers ayant répondu", "Sans réponse (personnes)"])
+
+
+def _age_at(start_col, birth_col):
+    """Âge révolu à `start_col` (SQLite : strftime)."""
+    years = cast(func.strftime("%Y", start_col), Integer) - cast(func.strftime("%Y", birth_col), Integer)
+    before_birthday = case((func.strftime("%m-%d", start_col) < func.strftime("%m-%d", birth_col), 1), else_=0)
+    return years - before_birthday
+
+
+def catering_rows(db: Session) -> list[list]:
+    """Une ligne par créneau : une agrégation pour les effectifs, une pour les réponses par week-end."""
+    age = _age_at(EventWeekend.start_date, Member.birth_date)
+    present = PersonAttendance.id.isnot(None)
+    bracket_cols = [
+        func.sum(case((and_(present, Member.birth_date.isnot(None), age >= lo, age <= hi), 1), else_=0))
+        for _label, lo, hi in AGE_BRACKETS
+    ]
+    household = func.coalesce(PersonAttendance.responded_by, PersonAttendance.person_id)
+    headcounts = db.execute(
+        select(
+            EventWeekend.id, EventWeekend.name, EventSlot.date, EventSlot.label,
+            *bracket_cols,
+            func.sum(case((and_(present, Member.birth_date.is_(None)), 1), else_=0)),
+            func.count(PersonAttendance.id),
+            func.count(func.distinct(household)),
+        )
+        .select_from(EventSlot)
+        .join(EventWeekend, EventWeekend.id == EventSlot.weekend_id)
+        .outerjoin(PersonAttendance, and_(PersonAttendance.slot_id == EventSlot.id, PersonAttendance.present == True))  # noqa: E712
+        .outerjoin(Member, Member.id == PersonAttendance.person_id)
+        .group_by(EventSlot.id)
+        .order_by(EventWeekend.start_date, EventSlot.order_index, EventSlot.id)
+    ).all()
+
+    # Réponses (présent ou non) par week-end, et membres sans aucune réponse pour ce week-end
+    answered = (select(literal(1))
+                .select_from(PersonAttendance)
+                .join(EventSlot, EventSlot.id == PersonAttendance.slot_id)
+                .where(PersonAttendance.person_id == Member.id, EventSlot.weekend_id == EventWeekend.id))
+    missing = dict(db.execute(
+        select(EventWeekend.id, func.count(Member.id))
+        .select_from(EventWeekend).join(Member, true())
+        .where(~exists(answered))
+        .group_by(EventWeekend.id)
+    ).all())
+    replied = dict(db.execute(
+        select(EventSlot.weekend_id, func.count(func.distinct(household)))
+        .select_from(PersonAttendance)
+        .join(EventSlot, EventSlot.id == PersonAttendance.slot_id)
+        .group_by(EventSlot.weekend_id)
+    ).all())
+
+    rows = []
+    for weekend_id, weekend_name, slot_date, label, *counts in headcounts:
+        rows.append([weekend_name, slot_date.strftime("%d/%m/%Y"), label, *[int(c or 0) for c in counts],
+                     replied.get(weekend_id, 0), missing.get(weekend_id, 0)])
+    return rows
+
+
+def iter_csv(rows: list[list]):
+    buf = io.StringIO()
+    writer = csv.writer(buf, delimiter=";")  # Excel FR ouvre directement le ; comme séparateur
+    buf.write("\ufeff")  # BOM : accents corrects dans Excel
+    for row in [COLUMNS, *rows]:
+        writer.writerow(row)
+        yield buf.getvalue().encode("utf-8")
+        buf.seek(0); buf.truncate()
+
+
+def _xlsx_cell(ref: str, value) -> str:
+    if isinstance(value, (int, float)):
+        return f'<c r="{ref}"><v>{value}</v></c>'
+    return f'<c r="{ref}" t="inlineStr"><is><t>{escape(str(value))}</t></is></c>'
+
+
+def _col_letter(idx: int) -> str:
+    out = ""
+    idx += 1
+    while idx:
+        idx, rem = divmod(idx - 1, 26)
+        out = chr(65 + rem) + out
+    return out
+
+
+def build_xlsx(rows: list[list], sheet_name: str = "Traiteur") -> bytes:
+    """XLSX minimal (une feuille, chaînes inline) écrit avec zipfile : pas besoin d'openpyxl."""
+    sheet_rows = []
+    for r, row in enumerate([COLUMNS, *rows], start=1):
+        cells = "".join(_xlsx_cell(f"{_col_letter(c)}{r}", v) for c, v in enumerate(row))
+        sheet_rows.append(f'<row r="{r}">{cells}</row>')
+    files = {
+        "[Content_Types].xml": (
+            '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+            '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+            '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+            '<Default Extension="xml" ContentType="application/xml"/>'
+            '<Override PartName="/xl/workbook.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+            '<Override PartName="/xl/worksheets/sheet1.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+            '</Types>'),
+        "_rels/.rels": (
+            '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+            '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+            '<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" Target="xl/workbook.xml"/>'
+            '</Relationships>'),
+        "xl/workbook.xml": (
+            '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+            '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+            'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+            f'<sheets><sheet name="{escape(sheet_name)}" sheetId="1" r:id="rId1"/></sheets></workbook>'),
+        "xl/_rels/workbook.xml.rels": (
+            '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+            '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+            '<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" Target="worksheets/sheet1.xml"/>'
+            '</Relationships>'),
+        "xl/worksheets/sheet1.xml": (
+            '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+            '<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+            f'<sheetData>{"".join(sheet_rows)}</sheetData></worksheet>'),
+    }
+    buf = io.BytesIO()
+    with zipfile.ZipFile(buf, "w", zipfile.ZIP_DEFLATED) as zf:
+        for name, content in files.items():
+            zf.writestr(name, content)
+    return buf.getvalue()
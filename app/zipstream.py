@@ -0,0 +1,69 @@
+# app/zipstream.py
+# Archive ZIP produite à la volée : rien n'est bufferisé au-delà d'un morceau de fichier
+
+import os, zipfile
+
+CHUNK_SIZE = 256 * 1024
+# Formats déjà compressés : STORED, pas de recompression inutile
+STORED_EXTS = {".jpg", ".jpeg", ".png", ".webp", ".heic", ".gif", ".zip", ".xlsx"}
+
+
+class _ChunkSink:
+    """Fichier en écriture seule et non seekable : zipfile passe alors en mode "data descriptor"."""
+
+    def __init__(self):
+        self._chunks: list[bytes] = []
+        self._offset = 0
+
+    def write(self, data) -> int:
+        if data:
+            self._chunks.append(bytes(data))
+            self._offset += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        # zipfile utilise tell() pour les offsets du répertoire central, jamais seek()
+        return self._offset
+
+    def flush(self):
+        pass
+
+    def drain(self) -> bytes:
+        out = b"".join(self._chunks)
+        self._chunks.clear()
+        return out
+
+
+def stream_zip(entries, chunk_size: int = CHUNK_SIZE):
+    """Génère les octets d'un ZIP pour `entries` = [(chemin disque, nom dans l'archive, datetime), ...].
+
+    ZIP64 est activé automatiquement par zipfile dès qu'une entrée ou l'archive dépasse 4 Go.
+    Les fichiers manquants sont ignorés.
+    """
+    sink = _ChunkSink()
+    with zipfile.ZipFile(sink, mode="w", allowZip64=True) as zf:
+        for path, arcname, mtime in entries:
+            try:
+                size = os.path.getsize(path)
+            except OSError:
+                continue
+            # Le format ZIP ne sait pas dater avant 1980 (vieux scans)
+            stamp = mtime.timetuple()[:6] if mtime and mtime.year >= 1980 else (1980, 1, 1, 0, 0, 0)
+            info = zipfile.ZipInfo(arcname, date_time=stamp)
+            ext = os.path.splitext(arcname)[1].lower()
+            info.compress_type = zipfile.ZIP_STORED if ext in STORED_EXTS else zipfile.ZIP_DEFLATED
+            info.file_size = size
+            with open(path, "rb") as src, zf.open(info, mode="w") as dest:
+                while True:
+                    block = src.read(chunk_size)
+                    if not block:
+                        break
+                    dest.write(block)
+                    data = sink.drain()
+                    if data:
+                        yield data
+            data = sink.drain()  # data descriptor de l'entrée
+            if data:
+                yield data
+    # Répertoire central écrit à la fermeture
+    yield sink.drain()
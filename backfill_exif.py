@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+# backfill_exif.py
+# Renseigne Photo.taken_at / camera / orientation pour les photos déjà présentes dans media/photos/full.
+#
+#   python backfill_exif.py                 # toutes les photos pas encore analysées
+#   python backfill_exif.py --workers 8 --batch 500
+#
+# Reprise possible : chaque lot est commité et marqué exif_scanned, un nouveau lancement repart
+# là où le précédent s'est arrêté. Seul le process principal écrit dans la base.
+
+import os, sys, argparse
+from concurrent.futures import ProcessPoolExecutor
+
+from sqlalchemy import create_engine, select, update
+from sqlalchemy.orm import sessionmaker
+
+from app.models import Photo
+from app.photo_meta import extract_exif_from_path
+from app.changefeed import mark_changed
+
+DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./cousinade.db")
+PHOTOS_FULL = os.path.join("media", "photos", "full")
+
+
+def _scan(item: tuple[int, str]) -> tuple[int, dict | None]:
+    photo_id, stored_name = item
+    try:
+        return photo_id, extract_exif_from_path(os.path.join(PHOTOS_FULL, stored_name))
+    except Exception:
+        # Fichier manquant ou illisible : on le marque quand même pour ne pas boucler dessus
+        return photo_id, None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Extraire les EXIF des photos existantes.")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 2, help="Nombre de process")
+    parser.add_argument("--batch", type=int, default=200, help="Photos par lot (un commit par lot)")
+    parser.add_argument("--rescan", action="store_true", help="Réanalyse aussi les photos déjà traitées")
+    args = parser.parse_args()
+
+    engine = create_engine(DATABASE_URL, connect_args={"check_same_thread": False} if DATABASE_URL.startswith("sqlite") else {})
+    Session = sessionmaker(bind=engine, autoflush=False, autocommit=False)
+
+    with Session() as db:
+        if args.rescan:
+            db.execute(update(Photo).values(exif_scanned=False))
+            db.commit()
+        todo = db.execute(select(Photo.id, Photo.stored_name, Photo.orientation)
+                          .where(Photo.exif_scanned == False)  # noqa: E712
+                          .order_by(Photo.id)).all()
+        print(f"{len(todo)} photo(s) à analyser.")
+        if not todo:
+            return
+
+        done = found = 0
+        with ProcessPoolExecutor(max_workers=args.workers) as pool:
+            for start in range(0, len(todo), args.batch):
+                batch = todo[start:start + args.batch]
+                chunk = [(row.id, row.stored_name) for row in batch]
+                results = list(pool.map(_scan, chunk, chunksize=max(1, len(chunk) // (args.workers * 4))))
+                rows = []
+                for row, (photo_id, meta) in zip(batch, results):
+                    values = {"id": photo_id, "exif_scanned": True}
+                    if meta:
+                        # On n'écrase jamais une valeur connue par un None ; l'orientation lue sur la
+                        # version full vaut toujours 1, celle de l'original (upload) est plus utile
+                        values.update({k: v for k, v in meta.items() if v is not None})
+                        if row.orientation is not None:
+                            values.pop("orientation", None)
+                        found += meta["taken_at"] is not None
+                    rows.append(values)
+                # Lot groupé : UPDATE ... WHERE id = ? en executemany
+                db.execute(update(Photo), rows)
+                # UPDATE en masse, hors flush : on alimente /api/changes à la main
+                mark_changed(db, "photos", [r["id"] for r in rows if len(r) > 2])
+                db.commit()
+                done += len(chunk)
+                print(f"{done}/{len(todo)} analysées ({found} avec date de prise de vue)", file=sys.stderr)
+
+    print("Backfill terminé.")
+
+
+if __name__ == "__main__":
+    main()
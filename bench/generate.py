@@ -0,0 +1,165 @@
+# bench/generate.py
+# Générateur de grandes familles synthétiques (plusieurs générations) pour les benchmarks
+
+import io, random
+from datetime import date, timedelta
+
+from PIL import Image, ImageDraw
+from sqlalchemy import select, func
+
+from app.models import Member, ParentChild, Couple, EventWeekend, EventSlot, PersonAttendance
+
+FIRST_NAMES = ["Jean", "Marie", "Pierre", "Anne", "Louis", "Claire", "Paul", "Sophie", "Luc", "Julie",
+               "Hugo", "Léa", "Nicolas", "Camille", "Thomas", "Emma", "Julien", "Chloé", "Antoine", "Inès",
+               "Karim", "Yasmine", "Mehdi", "Sarah", "Rémi", "Fabienne", "Elian", "Lena", "David", "Nora"]
+LAST_NAMES = ["Martin", "Bernard", "Dubois", "Guessab", "Moreau", "Laurent", "Simon", "Michel", "Lefebvre",
+              "Leroy", "Roux", "David", "Bertrand", "Morel", "Fournier", "Girard", "Bonnet", "Dupont"]
+CITIES = [("Lyon", "69000"), ("Paris", "75011"), ("Marseille", "13001"), ("Lille", "59000"),
+          ("Nantes", "44000"), ("Toulouse", "31000"), ("Annecy", "74000"), ("Brest", "29200")]
+SLOT_LABELS = ["Vendredi soir", "Samedi midi", "Samedi soir", "Dimanche midi"]
+
+
+def _member(rng: random.Random, seq: int, last_name: str, birth_year: int, branch: str) -> Member:
+    city, postal = rng.choice(CITIES)
+    first = rng.choice(FIRST_NAMES)
+    has_email = birth_year < 2008 and rng.random() < 0.8
+    return Member(
+        first_name=first,
+        last_name=last_name,
+        birth_date=date(birth_year, rng.randint(1, 12), rng.randint(1, 28)),
+        email=f"{first.lower()}.{last_name.lower()}.{seq}@example.org" if has_email else None,
+        phone=f"06.{rng.randint(10, 99)}.{rng.randint(10, 99)}.{rng.randint(10, 99)}.{rng.randint(10, 99)}" if has_email else None,
+        address=f"{rng.randint(1, 120)} rue des Cousins",
+        postal_code=postal,
+        city=city,
+        family_branch=branch,
+    )
+
+
+def generate_family(db, members: int = 5000, seed: int = 2026) -> list[int]:
+    """Crée ~`members` membres sur plusieurs générations (couples, enfants, conjoints).
+
+    Renvoie la liste des ids créés. Les membres et liens sont insérés par lots (add_all + flush).
+    """
+    rng = random.Random(seed)
+    created: list[Member] = []
+    couples: list[tuple[Member, Member]] = []
+    links: list[tuple[Member, Member]] = []
+
+    # Une branche = un couple d'ancêtres et toute sa descendance ; on en ajoute jusqu'à la taille voulue
+    branch = 0
+    while len(created) < members:
+        tag = f"branche-{branch}"
+        a = _member(rng, len(created), rng.choice(LAST_NAMES), rng.randint(1930, 1945), tag)
+        c = _member(rng, len(created) + 1, rng.choice(LAST_NAMES), rng.randint(1930, 1945), tag)
+        created += [a, c]
+        couples.append((a, c))
+        generation = [(a, c)]
+        while generation and len(created) < members:
+            next_generation = []
+            for parent, spouse_of_parent in generation:
+                for _ in range(rng.randint(1, 4)):
+                    if len(created) >= members:
+                        break
+                    year = min(parent.birth_date.year + rng.randint(22, 38), 2024)
+                    child = _member(rng, len(created), parent.last_name, year, tag)
+                    created.append(child)
+                    links.append((parent, child))
+                    if spouse_of_parent is not None:
+                        links.append((spouse_of_parent, child))
+                    spouse = None
+                    if year < 2000 and rng.random() < 0.75 and len(created) < members:
+                        spouse = _member(rng, len(created), rng.choice(LAST_NAMES), year + rng.randint(-3, 3), tag)
+                        created.append(spouse)
+                        couples.append((child, spouse))
+                    if year < 2002:
+                        next_generation.append((child, spouse))
+            generation = next_generation
+        branch += 1
+
+    db.add_all(created)
+    db.flush()
+    db.add_all([Couple(partner_a_id=a.id, partner_b_id=b.id, status="current") for a, b in couples])
+    db.add_all([ParentChild(parent_id=p.id, child_id=ch.id) for p, ch in links])
+    db.commit()
+    return [m.id for m in created]
+
+
+def generate_events(db, weekends: int = 2, start: date = date(2026, 5, 1)) -> list[int]:
+    """Crée `weekends` week-ends (vendredi -> dimanche) de 4 créneaux chacun ; renvoie les ids des créneaux."""
+    slot_ids = []
+    for w in range(weekends):
+        friday = start + timedelta(days=7 * w)
+        wk = EventWeekend(name=f"Week-end {w + 1} ({friday:%d/%m/%Y})", start_date=friday, end_date=friday + timedelta(days=2))
+        db.add(wk); db.flush()
+        days = [friday, friday + timedelta(days=1), friday + timedelta(days=1), friday + timedelta(days=2)]
+        slots = [EventSlot(weekend_id=wk.id, date=d, label=lbl, order_index=i)
+                 for i, (d, lbl) in enumerate(zip(days, SLOT_LABELS))]
+        db.add_all(slots); db.flush()
+        slot_ids += [s.id for s in slots]
+    db.commit()
+    return slot_ids
+
+
+def generate_attendance(db, member_ids: list[int], slot_ids: list[int], rows: int = 50000, seed: int = 2026) -> int:
+    """Insère jusqu'à `rows` présences (personne, créneau) distinctes, tirées au hasard."""
+    rng = random.Random(seed)
+    rows = min(rows, len(member_ids) * len(slot_ids))
+    pairs = set()
+    while len(pairs) < rows:
+        pairs.add((rng.choice(member_ids), rng.choice(slot_ids)))
+    db.execute(PersonAttendance.__table__.insert(),
+               [{"person_id": p, "slot_id": s, "present": True} for p, s in pairs])
+    db.commit()
+    return rows
+
+
+def sample_image(seed: int, size: tuple[int, int] = (3000, 2000), fmt: str = "JPEG") -> bytes:
+    """Image "photo" synthétique (dégradé + formes), assez lourde pour que Pillow travaille."""
+    rng = random.Random(seed)
+    im = Image.linear_gradient("L").resize(size).convert("RGB")
+    draw = ImageDraw.Draw(im)
+    for _ in range(40):
+        x, y = rng.randrange(size[0]), rng.randrange(size[1])
+        r = rng.randint(20, size[0] // 6)
+        draw.ellipse((x - r, y - r, x + r, y + r), fill=(rng.randrange(256), rng.randrange(256), rng.randrange(256)))
+    buf = io.BytesIO()
+    im.save(buf, fmt, quality=90)
+    return buf.getvalue()
+
+
+def csv_rows(n: int, seed: int = 2026) -> list[dict]:
+    """Lignes au format de data/cousins.csv (cousin, conjoint, enfants, conjoints, petits-enfants)."""
+    rng = random.Random(seed)
+    out = []
+    while len(out) < n:
+        seq = len(out)
+        def row(kind, adult=True):
+            first = rng.choice(FIRST_NAMES)
+            year = rng.randint(1955, 1975) if kind in ("cousin", "conjoint") else rng.randint(1980, 2020)
+            return {"type": kind, "prénom": first,
+                    "téléphone": f"06.{rng.randint(10, 99)}.{rng.randint(10, 99)}.{rng.randint(10, 99)}.{seq:02d}" if adult else "",
+                    "email": f"{first.lower()}.{seq}.{len(out)}@example.org" if adult else "",
+                    "anniversaire": f"{rng.randint(1, 28):02d}/{rng.randint(1, 12):02d}/{year}"}
+        out.append(row("cousin"))
+        if rng.random() < 0.8:
+            out.append(row("conjoint"))
+        for _ in range(rng.randint(0, 3)):
+            out.append(row("enfant", adult=rng.random() < 0.5))
+            if rng.random() < 0.4:
+                out.append(row("enfant-conjoint"))
+                for _ in range(rng.randint(0, 2)):
+                    out.append(row("petit-enfant", adult=False))
+    return out[:n]
+
+
+def pick_household_owner(db) -> Member:
+    """Un membre avec email, conjoint et enfants : le cas le plus coûteux pour /rsvp et /edit."""
+    stmt = (select(Member)
+            .join(Couple, Couple.partner_a_id == Member.id)
+            .join(ParentChild, ParentChild.parent_id == Member.id)
+            .where(Member.email.isnot(None))
+            .group_by(Member.id)
+            .order_by(func.count(ParentChild.id).desc())
+            .limit(1))
+    return db.scalar(stmt)
@@ -0,0 +1,258 @@
+#!/usr/bin/env python3
+# bench/run.py
+# Benchmarks de bout en bout sur une base synthétique : latence, requêtes SQL, pic mémoire.
+#
+#   python -m bench.run --members 5000 --attendance 50000            # compare à bench/baseline.json
+#   python -m bench.run --members 5000 --attendance 50000 --save-baseline
+#   python -m bench.run --members 500 --no-baseline                  # mesure seule, sans comparaison
+#
+# Seul le nombre de requêtes SQL, déterministe, fait échouer le script (code 1) : latence et
+# mémoire d'une machine de dev ne se reproduisent pas ailleurs, elles sont seulement signalées.
+# Pour les comparer quand même, mesurer la référence dans le même job (ex. sur le merge-base) :
+#   git worktree add /tmp/base $(git merge-base HEAD main)
+#   (cd /tmp/base && python -m bench.run --save-baseline --baseline /tmp/ref.json)
+#   python -m bench.run --baseline /tmp/ref.json
+# Une référence absente ou mesurée à une autre échelle fait échouer le script (code 2).
+#
+# Dépendances : pip install -r bench/requirements.txt (httpx pour fastapi.testclient).
+# Tout tourne dans un dossier temporaire : la vraie base cousinade.db et media/ ne sont jamais touchés.
+
+import os, sys, io, json, time, shutil, argparse, tempfile, importlib, statistics, tracemalloc, contextlib
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_BASELINE = os.path.join(REPO_ROOT, "bench", "baseline.json")
+
+_queries = 0
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _count_query(conn, cursor, statement, parameters, context, executemany):
+    global _queries
+    _queries += 1
+
+
+def _prepare_workdir(workdir: str) -> None:
+    shutil.copytree(os.path.join(REPO_ROOT, "static"), os.path.join(workdir, "static"))
+    os.symlink(os.path.join(REPO_ROOT, "templates"), os.path.join(workdir, "templates"))
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(workdir, 'cousinade.db')}"
+    os.chdir(workdir)
+    if REPO_ROOT not in sys.path:
+        sys.path.insert(0, REPO_ROOT)
+
+
+def measure(name: str, fn, iterations: int) -> dict:
+    """Exécute `fn(i)` `iterations` fois pour la latence et le nombre de requêtes, puis une fois sous tracemalloc.
+
+    Un premier appel non mesuré chauffe les caches (templates Jinja, requêtes compilées) :
+    sinon le rendu à froid fait à lui seul le p95.
+    """
+    global _queries
+    fn(-1)
+    durations, queries = [], []
+    for i in range(iterations):
+        _queries = 0
+        t0 = time.perf_counter()
+        fn(i)
+        durations.append(time.perf_counter() - t0)
+        queries.append(_queries)
+
+    tracemalloc.start()
+    fn(iterations)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    durations.sort()
+    result = {
+        "iterations": iterations,
+        "median_ms": round(statistics.median(durations) * 1000, 2),
+        "p95_ms": round(durations[min(len(durations) - 1, int(len(durations) * 0.95))] * 1000, 2),
+        "queries": int(statistics.median(queries)),
+        "peak_kb": round(peak / 1024, 1),
+    }
+    print(f"{name:<20} {result['median_ms']:>10.2f} {result['p95_ms']:>10.2f} {result['queries']:>8} {result['peak_kb']:>11.1f}")
+    return result
+
+
+def compare(results: dict, baseline: dict, tolerance: float, min_ms: float = 5.0,
+            min_kb: float = 256.0) -> tuple[list[str], list[str]]:
+    """(régressions, avertissements).
+
+    Les régressions ne portent que sur le nombre de requêtes SQL, identique d'une machine à l'autre.
+    Latence et pic mémoire au-delà de `tolerance` *et* d'un écart absolu minimal ne sont que des
+    avertissements : ils dépendent de la machine et de sa charge.
+    """
+    regressions, warnings = [], []
+    for name, cur in results.items():
+        ref = baseline.get(name)
+        if not ref:
+            continue
+        if cur["queries"] > ref["queries"]:
+            regressions.append(f"{name}: requêtes SQL {ref['queries']} -> {cur['queries']}")
+        if cur["median_ms"] > max(ref["median_ms"] * (1 + tolerance), ref["median_ms"] + min_ms):
+            warnings.append(f"{name}: latence {ref['median_ms']} -> {cur['median_ms']} ms")
+        if cur["peak_kb"] > max(ref["peak_kb"] * (1 + tolerance), ref["peak_kb"] + min_kb):
+            warnings.append(f"{name}: pic mémoire {ref['peak_kb']} -> {cur['peak_kb']} Ko")
+    return regressions, warnings
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks Cousinade sur une famille synthétique.")
+    parser.add_argument("--members", type=int, default=5000, help="Nombre de membres générés")
+    parser.add_argument("--attendance", type=int, default=50000, help="Nombre de lignes PersonAttendance")
+    parser.add_argument("--weekends", type=int, default=2, help="Nombre de week-ends (4 créneaux chacun)")
+    parser.add_argument("--photos", type=int, default=10, help="Photos par envoi pour /photos/upload")
+    parser.add_argument("--csv-rows", type=int, default=500, help="Lignes CSV par import")
+    parser.add_argument("--iterations", type=int, default=10, help="Répétitions par page")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE, help="Fichier JSON de référence")
+    parser.add_argument("--save-baseline", action="store_true", help="Écrit les résultats comme nouvelle référence")
+    parser.add_argument("--no-baseline", action="store_true",
+                        help="Mesure seulement, sans comparaison (sinon une référence absente est une erreur)")
+    parser.add_argument("--tolerance", type=float, default=0.25,
+                        help="Marge au-delà de laquelle latence et mémoire sont signalées (0.25 = +25%%)")
+    args = parser.parse_args()
+    if not (args.save_baseline or args.no_baseline or os.path.exists(args.baseline)):
+        # Sans référence rien n'est comparé : on échoue tout de suite plutôt que de sortir en 0
+        print(f"Pas de référence {args.baseline} : --save-baseline pour en créer une, "
+              f"--no-baseline pour mesurer sans comparer.", file=sys.stderr)
+        sys.exit(2)
+
+    workdir = tempfile.mkdtemp(prefix="cousinade-bench-")
+    cwd = os.getcwd()
+    try:
+        _prepare_workdir(workdir)
+        from sqlalchemy import create_engine
+        from app.models import Base
+        Base.metadata.create_all(create_engine(os.environ["DATABASE_URL"]))
+
+        from fastapi.testclient import TestClient
+        from app import main as app_main
+        from bench import generate
+        importer = importlib.import_module("data.import")
+        send = importlib.import_module("send")
+
+        t0 = time.perf_counter()
+        with app_main.SessionLocal() as db:
+            member_ids = generate.generate_family(db, members=args.members)
+            slot_ids = generate.generate_events(db, weekends=args.weekends)
+            generate.generate_attendance(db, member_ids, slot_ids, rows=args.attendance)
+            owner = generate.pick_household_owner(db)
+            household = app_main.get_household(owner)
+            owner_email, owner_id = owner.email, owner.id
+            partners = [c.partner_b if c.partner_a_id == owner.id else c.partner_a for c in owner.couples_a + owner.couples_b]
+            children = [l.child for l in owner.children_links]
+            family = {
+                "owner": _member_payload(owner),
+                "partners": [{**_member_payload(p), "couple_status": "current"} for p in partners],
+                "children": [_member_payload(c) for c in children],
+                "parent_child": [{"parent_id": owner.id, "child_id": c.id} for c in children],
+            }
+            household_ids = [m.id for m in household]
+        print(f"Données : {len(member_ids)} membres, {len(slot_ids)} créneaux, {args.attendance} présences "
+              f"({time.perf_counter() - t0:.1f} s)\n")
+
+        client = TestClient(app_main.app)
+        r = client.post("/login", data={"email": owner_email}, follow_redirects=False)
+        assert r.status_code == 303, "login impossible"
+
+        images = [generate.sample_image(i) for i in range(args.photos)]
+        body_path = os.path.join(workdir, "body.txt")
+        with open(body_path, "w", encoding="utf-8") as fh:
+            fh.write("Bonjour {first_name}, rendez-vous sur {site_url}")
+        rsvp_form = {f"p_{pid}_{sid}": "on" for pid in household_ids for sid in slot_ids[::2]}
+
+        def get(url):
+            def run(_i):
+                resp = client.get(url)
+                assert resp.status_code == 200, (url, resp.status_code)
+            return run
+
+        def rsvp_save(_i):
+            resp = client.post("/rsvp/save", data=rsvp_form, follow_redirects=False)
+            assert resp.status_code == 303
+
+        def edit_save(_i):
+            resp = client.post("/edit/save", data={"owner_id": owner_id, "family_json": json.dumps(family)},
+                               follow_redirects=False)
+            assert resp.status_code == 303
+
+        def upload(_i):
+            files = [("files", (f"p{k}.jpg", data, "image/jpeg")) for k, data in enumerate(images)]
+            resp = client.post("/photos/upload", files=files, follow_redirects=False)
+            assert resp.status_code == 303
+
+        def csv_import(i):
+            with app_main.SessionLocal() as db:
+                importer.import_rows(db, generate.csv_rows(args.csv_rows, seed=1000 + i))
+
+        def send_dry_run(_i):
+            argv = sys.argv
+            sys.argv = ["send.py", "-s", "Cousinade", "-b", body_path, "--dry-run"]
+            try:
+                with contextlib.redirect_stdout(io.StringIO()):
+                    send.main()
+            finally:
+                sys.argv = argv
+
+        heavy = max(3, args.iterations // 5)
+        cases = [
+            ("GET /", get("/"), args.iterations),
+            ("GET /member/{id}", get(f"/member/{owner_id}"), args.iterations),
+            ("GET /rsvp", get("/rsvp"), args.iterations),
+            ("POST /rsvp/save", rsvp_save, args.iterations),
+            ("GET /rsvp/report", get("/rsvp/report.csv"), args.iterations),
+            ("POST /edit/save", edit_save, args.iterations),
+            ("POST /photos/upload", upload, heavy),
+            ("import CSV", csv_import, heavy),
+            ("send --dry-run", send_dry_run, heavy),
+        ]
+
+        print(f"{'cas':<20} {'médiane ms':>10} {'p95 ms':>10} {'requêtes':>8} {'pic mém Ko':>11}")
+        results = {name: measure(name, fn, n) for name, fn, n in cases}
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    scale = {"members": args.members, "attendance": args.attendance, "weekends": args.weekends,
+             "photos": args.photos, "csv_rows": args.csv_rows}
+    if args.save_baseline:
+        with open(args.baseline, "w", encoding="utf-8") as fh:
+            json.dump({"scale": scale, "results": results}, fh, indent=2, ensure_ascii=False)
+        print(f"\nRéférence écrite dans {args.baseline}")
+        return
+
+    if args.no_baseline:
+        print("\nComparaison désactivée (--no-baseline).")
+        return
+    with open(args.baseline, encoding="utf-8") as fh:
+        baseline = json.load(fh)
+    if baseline.get("scale") != scale:
+        # Comparer des mesures d'échelles différentes n'a pas de sens : échec explicite
+        print(f"\nRéférence mesurée à une autre échelle ({baseline.get('scale')}) ; "
+              f"relancer avec ces paramètres, --no-baseline ou --save-baseline.")
+        sys.exit(2)
+    regressions, warnings = compare(results, baseline["results"], args.tolerance)
+    if warnings:
+        print("\nÀ surveiller (latence / mémoire, indicatif) :")
+        for line in warnings:
+            print(f"- {line}")
+    if regressions:
+        print("\nRégressions :")
+        for line in regressions:
+            print(f"- {line}")
+        sys.exit(1)
+    print("\nAucune régression du nombre de requêtes SQL par rapport à la référence.")
+
+
+def _member_payload(m) -> dict:
+    return {
+        "id": m.id, "first_name": m.first_name, "last_name": m.last_name, "email": m.email,
+        "phone": m.phone, "address": m.address, "postal_code": m.postal_code, "city": m.city,
+        "birth_date": m.birth_date.isoformat() if m.birth_date else None,
+    }
+
+
+if __name__ == "__main__":
+    main()
@@ -1,15 +1,16 @@
 # scripts/import_csv.py
-import csv, datetime, secrets
+# Usage : python -m data.import [chemin/vers/cousins.csv]
+import csv, datetime, os, sys
 from sqlalchemy import create_engine, select
 from sqlalchemy.orm import sessionmaker
-from app.models import Base, Member, ParentChild, Couple, EditToken
+from app.models import Base, Member, ParentChild, Couple
+from app.cachebus import bump
+from app.changefeed import track_changes
 
-engine = create_engine("sqlite:///./cousinade.db", connect_args={"check_same_thread": False})
-SessionLocal = sessionmaker(bind=engine)
-Base.metadata.create_all(bind=engine)
+DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./cousinade.db")
 
 def get_or_create_member(db, first, last, birth=None, email=None, phone=None, branch=None):
-    m = db.scalar(select(Member).where(Member.first_name==first, 
+    m = db.scalar(select(Member).where(Member.first_name==first,
                                        Member.family_branch==branch,
                                        Member.phone == phone,
                                        Member.email == email
@@ -30,47 +31,28 @@ def get_or_create_member(db, first, last, birth=None, email=None, phone=None, br
     m.family_branch = m.family_branch or (branch or None)
     return m
 
-with SessionLocal() as db:
-    t = db.query(EditToken).all()
-    print(t[0].token)
+def _member_from_row(db, row):
+    return get_or_create_member(
+        db,
+        row["prénom"].strip(),
+        row.get("last_name") or ' ',
+        row.get("anniversaire") or None,
+        row.get("email") or None,
+        row.get("téléphone") or None,
+        row.get("type") or None
+    )
 
-    # cousins = db.query(Member).where((Member.first_name=='David'))  # ou ajoute un filtre si tu veux seulement certains
-    # for c in cousins:
-    #     token = secrets.token_urlsafe(32)
-    #     db.add(EditToken(
-    #         token=token,
-    #         owner_member_id=c.id,
-    #         expires_at=datetime.datetime.now() + datetime.timedelta(days=30)  # valide 30j
-    #     ))
-    # db.commit()
-exit()
-
-with SessionLocal() as db, open("cousins.csv", newline='', encoding="utf-8") as f:
-    r = csv.DictReader(f)
-    conjoint = False
-    for row in r:
-        print(row)
+def import_rows(db, rows, verbose=False):
+    # Les lignes se suivent : cousin, puis son conjoint, ses enfants, leurs conjoints, petits-enfants...
+    parent = conjoint = enfant = enfant_conjoint = None
+    for row in rows:
+        if verbose:
+            print(row)
         if row['type'] == 'cousin' :
-            parent = get_or_create_member(
-                db,
-                row["prénom"].strip(), 
-                row.get("last_name") or ' ',
-                row.get("anniversaire") or None,
-                row.get("email") or None,
-                row.get("téléphone") or None,
-                row.get("type") or None
-            )
+            parent = _member_from_row(db, row)
             conjoint = False
-        elif row['type'] == 'conjoint' : 
-            conjoint = get_or_create_member(
-                db,
-                row["prénom"].strip(), 
-                row.get("last_name") or ' ',
-                row.get("anniversaire") or None,
-                row.get("email") or None,
-                row.get("téléphone") or None,
-                row.get("type") or None
-            )
+        elif row['type'] == 'conjoint' :
+            conjoint = _member_from_row(db, row)
             exists = db.scalar(
                 select(Couple).where(
                     ((Couple.partner_a_id==parent.id) & (Couple.partner_b_id==conjoint.id)) |
@@ -80,32 +62,17 @@ with SessionLocal() as db, open("cousins.csv", newline='', encoding="utf-8") as
             if not exists:
                 db.add(Couple(partner_a_id=parent.id, partner_b_id=conjoint.id, status="current"))
 
-        elif row['type'] == 'enfant' : 
-            enfant = get_or_create_member(
-                db,
-                row["prénom"].strip(), 
-                row.get("last_name") or ' ',
-                row.get("anniversaire") or None,
-                row.get("email") or None,
-                row.get("téléphone") or None,
-                row.get("type") or None
-            )
+        elif row['type'] == 'enfant' :
+            enfant = _member_from_row(db, row)
+            enfant_conjoint = None
             if not db.scalar(select(ParentChild).where(ParentChild.parent_id==parent.id, ParentChild.child_id==enfant.id)):
                 db.add(ParentChild(parent_id=parent.id, child_id=enfant.id))
-            if conjoint :    
+            if conjoint :
                 if not db.scalar(select(ParentChild).where(ParentChild.parent_id==conjoint.id, ParentChild.child_id==enfant.id)):
                     db.add(ParentChild(parent_id=conjoint.id, child_id=enfant.id))
 
-        elif row['type'] == 'enfant-conjoint' : 
-            enfant_conjoint = get_or_create_member(
-                db,
-                row["prénom"].strip(), 
-                row.get("last_name") or ' ',
-                row.get("anniversaire") or None,
-                row.get("email") or None,
-                row.get("téléphone") or None,
-                row.get("type") or None
-            )
+        elif row['type'] == 'enfant-conjoint' :
+            enfant_conjoint = _member_from_row(db, row)
             exists = db.scalar(
                 select(Couple).where(
                     ((Couple.partner_a_id==enfant.id) & (Couple.partner_b_id==enfant_conjoint.id)) |
@@ -115,21 +82,33 @@ with SessionLocal() as db, open("cousins.csv", newline='', encoding="utf-8") as
             if not exists:
                 db.add(Couple(partner_a_id=enfant.id, partner_b_id=enfant_conjoint.id, status="current"))
 
-        elif row['type'] == 'petit-enfant' : 
-            penfant = get_or_create_member(
-                db,
-                row["prénom"].strip(), 
-                row.get("last_name") or ' ',
-                row.get("anniversaire") or None,
-                row.get("email") or None,
-                row.get("téléphone") or None,
-                row.get("type") or None
-            )
+        elif row['type'] == 'petit-enfant' :
+            penfant = _member_from_row(db, row)
             if not db.scalar(select(ParentChild).where(ParentChild.parent_id==enfant.id, ParentChild.child_id==penfant.id)):
                 db.add(ParentChild(parent_id=enfant.id, child_id=penfant.id))
-            if enfant_conjoint :    
+            if enfant_conjoint :
                 if not db.scalar(select(ParentChild).where(ParentChild.parent_id==enfant_conjoint.id, ParentChild.child_id==penfant.id)):
                     db.add(ParentChild(parent_id=enfant_conjoint.id, child_id=penfant.id))
 
         db.commit()
-print("Import terminé.")
+
+    # Invalide les caches (annuaire, foyers...) de tous les workers
+    bump(db, "members")
+    db.commit()
+
+def import_csv(db, path, verbose=False):
+    with open(path, newline='', encoding="utf-8") as f:
+        import_rows(db, csv.DictReader(f), verbose=verbose)
+
+def main():
+    path = sys.argv[1] if len(sys.argv) > 1 else os.path.join("data", "cousins.csv")
+    engine = create_engine(DATABASE_URL, connect_args={"check_same_thread": False})
+    Base.metadata.create_all(bind=engine)
+    SessionLocal = sessionmaker(bind=engine)
+    track_changes(SessionLocal)
+    with SessionLocal() as db:
+        import_csv(db, path, verbose=True)
+    print("Import terminé.")
+
+if __name__ == "__main__":
+    main()